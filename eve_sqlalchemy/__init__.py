@@ -8,21 +8,40 @@
 from __future__ import unicode_literals
 
 import collections
+import functools
+import hashlib
+import uuid
 from copy import copy
 
 import flask_sqlalchemy
 import simplejson as json
+from eve.exceptions import ConfigException
 from eve.io.base import ConnectionException, DataLayer
 from eve.utils import debug_error_message, str_to_date
-from flask import abort
+from flask import abort, current_app, g
+from sqlalchemy import inspect
+from sqlalchemy.ext import baked
+from sqlalchemy.orm import ColumnProperty, load_only
+from sqlalchemy.sql import expression as sqla_exp
 
 from .__about__ import __version__  # noqa
-from .parser import ParseError, parse, parse_dictionary, parse_sorting, sqla_op
-from .structures import SQLAResultCollection
+from .advisor import FilterShapeLog
+from .cache import LRUCache, SizedLRUCache
+from .instrumentation import (
+    add_rows, init_app as init_instrumentation, instrumented,
+)
+from .parser import (
+    ParseError, expression_key, filter_cache, lookup_key, parameterize, parse,
+    parse_dictionary, parse_keyset, parse_sorting, sqla_op,
+)
+from .structures import CachedResultCollection, SQLAResultCollection
 from .utils import (
-    extract_sort_arg, rename_relationship_fields_in_dict,
+    column_default, column_plan, decode_cursor, extract_sort_arg,
+    projected_columns, relationship_load_options,
+    rename_relationship_fields_in_dict,
     rename_relationship_fields_in_sort_args, rename_relationship_fields_in_str,
-    sqla_object_to_dict, validate_filters,
+    row_to_dict, sqla_object_to_dict, supports_bulk_delete,
+    supports_bulk_update, validate_filters,
 )
 
 db = flask_sqlalchemy.SQLAlchemy()
@@ -34,17 +53,77 @@ except NameError:
     string_type = str
 
 
+def invalidates_results(f):
+    """Decorates a write method of :class:`SQL` taking the resource as its
+    first argument to invalidate the cached results depending on it once
+    the method succeeded."""
+    @functools.wraps(f)
+    def decorated(self, resource, *args, **kwargs):
+        result = f(self, resource, *args, **kwargs)
+        self._invalidate_results(resource)
+        return result
+    return decorated
+
+
+def _remove_unknown_total_count(response):
+    """Removes the total count header Eve adds to collections which are never
+    counted, see the `none` count strategy."""
+    header = current_app.config['HEADER_TOTAL_COUNT']
+    if response.headers.get(header) == 'None':
+        del response.headers[header]
+    return response
+
+
 class SQL(DataLayer):
     """
     SQLAlchemy data access layer for Eve REST API.
     """
     driver = db
+    replace_modes = ('update', 'recreate')
     serializers = {
         'datetime': str_to_date,
         'number': lambda val: json.loads(val) if val is not None else None,
     }
 
     def init_app(self, app):
+        app.config.setdefault('SQL_PAGINATION_MODE', 'offset')
+        app.config.setdefault('SQL_QUERY_AFTER', 'after')
+        app.config.setdefault('SQL_COUNT_STRATEGY', 'exact')
+        app.config.setdefault('SQL_COUNT_CACHE_SIZE', 1024)
+        app.config.setdefault('SQL_COUNT_CACHE_TTL', 60)
+        app.config.setdefault('SQL_FILTER_CACHE_SIZE', 512)
+        app.config.setdefault('SQL_BAKED_QUERIES', True)
+        app.config.setdefault('SQL_BAKED_QUERY_CACHE_SIZE', 200)
+        app.config.setdefault('SQL_IN_CHUNK_SIZE', 500)
+        app.config.setdefault('SQL_DELETE_CHUNK_SIZE', 500)
+        app.config.setdefault('SQL_REPLACE_MODE', 'update')
+        app.config.setdefault('SQL_BULK_UPDATE', True)
+        app.config.setdefault('SQL_EXPORT_BATCH_SIZE', 1000)
+        app.config.setdefault('SQL_MEDIA_CHUNK_SIZE', 255 * 1024)
+        app.config.setdefault('SQL_INSTRUMENTATION', False)
+        app.config.setdefault('SQL_INSTRUMENTATION_HEADERS', False)
+        app.config.setdefault('SQL_INSTRUMENTATION_SINK', None)
+        app.config.setdefault('SQL_SLOW_QUERY_THRESHOLD', None)
+        app.config.setdefault('SQL_SLOW_QUERY_EXPLAIN', True)
+        app.config.setdefault('SQL_RECORD_FILTER_SHAPES', False)
+        app.config.setdefault('SQL_RESULT_CACHE', False)
+        app.config.setdefault('SQL_RESULT_CACHE_BACKEND', None)
+        app.config.setdefault('SQL_RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        app.config.setdefault('SQL_RESULT_CACHE_TTL', None)
+        self._count_cache = LRUCache(app.config['SQL_COUNT_CACHE_SIZE'])
+        self._column_plans = LRUCache(1024)
+        self._result_cache = app.config['SQL_RESULT_CACHE_BACKEND'] or \
+            SizedLRUCache(app.config['SQL_RESULT_CACHE_MAX_BYTES'])
+        self._result_cache_stats = collections.Counter()
+        self._result_tables = {}
+        self._bakery = baked.bakery(
+            size=app.config['SQL_BAKED_QUERY_CACHE_SIZE'])
+        filter_cache.maxsize = app.config['SQL_FILTER_CACHE_SIZE']
+        self.filter_shapes = FilterShapeLog()
+        app.after_request(_remove_unknown_total_count)
+        if app.config['SQL_INSTRUMENTATION'] or \
+           app.config['SQL_SLOW_QUERY_THRESHOLD'] is not None:
+            init_instrumentation(app)
         try:
             # FIXME: dumb double initialisation of the
             # driver because Eve sets it to None in __init__
@@ -54,7 +133,8 @@ class SQL(DataLayer):
         except Exception as e:
             raise ConnectionException(e)
 
-    def find(self, resource, req, sub_resource_lookup):
+    @instrumented('find')
+    def find(self, resource, req, sub_resource_lookup, count_strategy=None):
         """Retrieves a set of documents matching a given request. Queries can
         be expressed in two different formats: the mongo query syntax, and the
         python syntax. The first kind of query would look like: ::
@@ -70,7 +150,23 @@ class SQL(DataLayer):
         :param resource: resource name.
         :param req: a :class:`ParsedRequest`instance.
         :param sub_resource_lookup: sub-resource lookup from the endpoint url.
+        :param count_strategy: overrides `SQL_COUNT_STRATEGY` if given.
         """
+        result_key = cached = None
+        if count_strategy is None and \
+           self._resource_setting(resource, 'SQL_RESULT_CACHE'):
+            result_key = self._result_key(resource, req, sub_resource_lookup)
+            data = self._result_cache.get(result_key)
+            if data is not None:
+                self._result_cache_stats['hits'] += 1
+                cached = CachedResultCollection.loads(data)
+                if cached.count() is not None or self._resource_setting(
+                        resource, 'SQL_COUNT_STRATEGY') == 'none':
+                    return cached
+                # The collection is only built to count the results.
+            else:
+                self._result_cache_stats['misses'] += 1
+
         try:
             args = {'sort': extract_sort_arg(req),
                     'resource': resource}
@@ -83,17 +179,24 @@ class SQL(DataLayer):
         model, args['spec'], fields, args['sort'] = \
             self._datasource_ex(resource, [], client_projection,
                                 args['sort'], client_embedded)
+        embedded = self._embedded_paths(client_embedded)
+        # The key identifying the shape of the query for baking. The filter
+        # of the datasource is the same for all requests, but it may include
+        # an additional condition for the `auth_field`.
+        cache_key = [resource, len(args['spec'])]
         if req.where:
             try:
                 where = rename_relationship_fields_in_str(model, req.where)
                 args['spec'] = self.combine_queries(args['spec'],
                                                     parse(where, model))
+                cache_key.append(expression_key(where))
             except ParseError:
                 try:
                     spec = rename_relationship_fields_in_dict(
                         model, json.loads(req.where))
                     args['spec'] = self.combine_queries(
                         args['spec'], parse_dictionary(spec, model))
+                    cache_key.append(lookup_key(model, spec))
                 except (AttributeError, TypeError):
                     # if parse failed and json loads fails - raise 400
                     abort(400)
@@ -109,30 +212,101 @@ class SQL(DataLayer):
                 self.combine_queries(args['spec'],
                                      parse_dictionary(sub_resource_lookup,
                                                       model))
+            cache_key.append(lookup_key(model, sub_resource_lookup))
 
         if req.if_modified_since:
             updated_filter = sqla_op.gt(
                 getattr(model, self.app.config.LAST_UPDATED),
                 req.if_modified_since)
-            args['spec'].append(updated_filter)
-
-        query = self.driver.session.query(model)
+            args['spec'] = self.combine_queries(args['spec'],
+                                                [updated_filter])
+            cache_key.append(self.app.config.LAST_UPDATED)
+
+        keys = []
+        if self._resource_setting(resource, 'SQL_PAGINATION_MODE') == 'keyset':
+            args['sort'] = self._keyset_sort(resource, model, args['sort'])
+            args['keyset'] = [(s[0], s[1]) for s in args['sort']]
+            # the values of the sort keys are needed for the next cursor
+            keys = [key for key, _ in args['keyset']]
+            after = self._client_after(req)
+            if after:
+                args['after'] = self._keyset_filter(model, args['keyset'],
+                                                    after)
+
+        columns = self._column_plan(resource, model, fields)
+        if columns:
+            # Select plain rows, skipping the construction of model instances.
+            args['columns'] = columns
+            keys = list(columns) + [k for k in keys if k not in columns]
+            query = self.driver.session.query(
+                *[getattr(model, key) for key in keys])
+        else:
+            query = self.driver.session.query(model) \
+                .options(*self._load_options(model, fields + keys, embedded))
 
+        if self.app.config['SQL_RECORD_FILTER_SHAPES']:
+            self.filter_shapes.record(model, args['spec'], args['sort'])
         if args['sort']:
+            cache_key.append(tuple(tuple(a) for a in args['sort']))
             args['sort'] = [parse_sorting(model, *a) for a in args['sort']]
 
+        if self._resource_setting(resource, 'SQL_BAKED_QUERIES') and \
+           None not in cache_key:
+            args['bakery'] = self._bakery
+            # The selected columns may also depend on settings like IF_MATCH.
+            args['cache_key'] = tuple(cache_key + [tuple(fields), embedded,
+                                                   tuple(keys)])
+
+        args['count_strategy'] = count_strategy or \
+            self._resource_setting(resource, 'SQL_COUNT_STRATEGY')
+        if args['count_strategy'] == 'cached':
+            args['count_cache'] = self._count_cache
+            args['count_cache_ttl'] = \
+                self._resource_setting(resource, 'SQL_COUNT_CACHE_TTL')
+
         if req.max_results:
             args['max_results'] = req.max_results
-        if req.page > 1:
+        if req.page > 1 and 'after' not in args:
             args['page'] = req.page
-        return SQLAResultCollection(query, fields, **args)
+        collection = SQLAResultCollection(query, fields, **args)
+        if result_key is not None:
+            def store(result):
+                data = result.dumps()
+                if data is not None:
+                    self._result_cache.set(result_key, data, ttl)
+
+            ttl = self._resource_setting(resource, 'SQL_RESULT_CACHE_TTL')
+            if cached is None:
+                cached = CachedResultCollection.from_collection(collection)
+                store(cached)
+            cached.count_from(collection, store)
+            return cached
+        return collection
+
+    def export(self, resource, req, sub_resource_lookup=None):
+        """Returns all documents matching a request regardless of its
+        pagination, without counting them. Iterate over the
+        :meth:`~SQLAResultCollection.stream` of the returned collection to
+        fetch the rows in batches.
 
+        :param resource: resource name.
+        :param req: a :class:`ParsedRequest`instance.
+        :param sub_resource_lookup: sub-resource lookup from the endpoint url.
+        """
+        req = copy(req)
+        req.max_results = 0
+        req.page = 1
+        return self.find(resource, req, sub_resource_lookup,
+                         count_strategy='none')
+
+    @instrumented('find_one')
     def find_one(self, resource, req, **lookup):
         client_projection = self._client_projection(req)
         client_embedded = self._client_embedded(req)
         model, filter_, fields, _ = \
             self._datasource_ex(resource, [], client_projection, None,
                                 client_embedded)
+        embedded = self._embedded_paths(client_embedded)
 
         lookup = rename_relationship_fields_in_dict(model, lookup)
         id_field = self._id_field(resource)
@@ -142,39 +316,165 @@ class SQL(DataLayer):
             # that commes from embeddable parameter
             return lookup
         else:
-            filter_ = self.combine_queries(filter_,
-                                           parse_dictionary(lookup, model))
-            query = self.driver.session.query(model)
-            document = query.filter(*filter_).first()
+            document = self._find_first(resource, model, filter_, fields,
+                                        lookup, embedded)
 
-        return sqla_object_to_dict(document, fields) if document else None
+        if document is None:
+            return None
+        add_rows(1)
+        return sqla_object_to_dict(document, fields)
 
+    @instrumented('find_one')
     def find_one_raw(self, resource, _id):
         model, filter_, fields, _ = \
             self._datasource_ex(resource, [], None, None, None)
         id_field = self._id_field(resource)
         lookup = {id_field: _id}
+        document = self._find_first(resource, model, filter_, fields, lookup)
+        if document is None:
+            return None
+        add_rows(1)
+        return sqla_object_to_dict(document, fields)
+
+    def _find_first(self, resource, model, filter_, fields, lookup,
+                    embedded=()):
+        """Returns the first instance of `model` matching the datasource
+        filter and the lookup, only loading the columns required to render
+        `fields` and eagerly loading the `embedded` relationships.
+
+        A baked query is used if the shape of the lookup is known, so the SQL
+        only has to be compiled once per resource, set of lookup fields and
+        projection.
+        """
+        mapper = inspect(model)
+        pk = mapper.primary_key
+        pk_field = mapper.get_property_by_column(pk[0]).key
+        if len(pk) == 1 and pk_field in lookup and lookup[pk_field] is None:
+            # e.g. an embedded relation which is not set
+            return None
+        key = lookup_key(model, lookup)
+        options = self._load_options(model, fields, embedded)
+        if key is not None and not filter_ and len(lookup) == 1:
+            if len(pk) == 1 and pk_field in lookup:
+                # Documents embedded by Eve have usually been loaded with
+                # the embedding document already and are taken from the
+                # session's identity map.
+                return self.driver.session.query(model).options(*options) \
+                    .get(lookup[pk_field])
+
         filter_ = self.combine_queries(filter_,
                                        parse_dictionary(lookup, model))
-        document = self.driver.session.query(model).filter(*filter_).first()
-        return sqla_object_to_dict(document, fields) if document else None
-
+        if self.app.config['SQL_RECORD_FILTER_SHAPES']:
+            self.filter_shapes.record(model, filter_)
+        if key is None or \
+           not self._resource_setting(resource, 'SQL_BAKED_QUERIES'):
+            return self.driver.session.query(model).options(*options) \
+                .filter(*filter_).first()
+
+        conditions, params = parameterize(filter_)
+        bq = self._bakery(lambda s: s.query(model).options(*options),
+                          resource, len(conditions), key, tuple(fields),
+                          embedded)
+        bq += lambda q: q.filter(*conditions)
+        return bq(self.driver.session()).params(**params).first()
+
+    @instrumented('find')
     def find_list_of_ids(self, resource, ids, client_projection=None):
-        raise NotImplementedError
+        """Retrieves the documents of a resource with the given ids, in the
+        order of `ids`. Unknown ids are skipped.
+
+        The documents are fetched with a single `IN` query per
+        `SQL_IN_CHUNK_SIZE` ids.
+
+        :param resource: resource name.
+        :param ids: list of ids.
+        :param client_projection: a specific projection to use.
+        """
+        model, filter_, fields, _ = \
+            self._datasource_ex(resource, [], client_projection)
+        id_field = self._id_field(resource)
+        if id_field not in fields:
+            fields.append(id_field)
+
+        columns = self._column_plan(resource, model, fields)
+        if columns:
+            query = self.driver.session.query(
+                *[getattr(model, key) for key in columns])
+        else:
+            query = self.driver.session.query(model) \
+                .options(*self._load_options(model, fields))
+        query = query.filter(*filter_)
+
+        # ids sent by clients might be strings even for integer ids
+        ids = list(collections.OrderedDict(
+            ('{0}'.format(id_), id_) for id_ in ids).items())
+        chunk_size = self.app.config['SQL_IN_CHUNK_SIZE']
+        documents = {}
+        for i in range(0, len(ids), chunk_size):
+            chunk = [id_ for _, id_ in ids[i:i + chunk_size]]
+            for item in query.filter(getattr(model, id_field).in_(chunk)):
+                document = row_to_dict(item, columns) if columns \
+                    else sqla_object_to_dict(item, fields)
+                documents['{0}'.format(document[id_field])] = document
+        add_rows(len(documents))
+        return [documents[key] for key, _ in ids if key in documents]
+
+    def find_existing_values(self, resource, field, values):
+        """Returns the subset of `values` already used for `field` by the
+        documents of a resource, using one `IN` query per `SQL_IN_CHUNK_SIZE`
+        values.
+
+        Returns `None` if `field` is not a plain column or if any of the
+        values does not match the column's type, as the database might
+        compare them differently.
 
+        :param resource: resource name.
+        :param field: field name.
+        :param values: the values to check.
+        """
+        model, filter_, _, _ = self._datasource_ex(resource, [])
+        attr = getattr(model, field, None)
+        prop = getattr(attr, 'property', None)
+        if not isinstance(prop, ColumnProperty):
+            return None
+        try:
+            python_type = prop.columns[0].type.python_type
+        except NotImplementedError:
+            return None
+        values = list(values)
+        if not all(isinstance(v, python_type) for v in values):
+            return None
+
+        query = self.driver.session.query(attr).filter(*filter_)
+        chunk_size = self.app.config['SQL_IN_CHUNK_SIZE']
+        result = set()
+        for i in range(0, len(values), chunk_size):
+            chunk = values[i:i + chunk_size]
+            result.update(v for v, in query.filter(attr.in_(chunk)))
+        return result
+
+    @instrumented('insert')
+    @invalidates_results
     def insert(self, resource, doc_or_docs):
+        """Inserts all documents in a single transaction. The model instances
+        are flushed in one unit of work, which allows SQLAlchemy to batch the
+        INSERT statements, and the generated ids are read before committing,
+        so they don't have to be reloaded.
+        """
+        id_field = self._id_field(resource)
+        model_instances = [self._create_model_instance(resource, document)
+                           for document in doc_or_docs]
+        self.driver.session.add_all(model_instances)
+        self.driver.session.flush()
         rv = []
-        for document in doc_or_docs:
-            model_instance = self._create_model_instance(resource, document)
-            self.driver.session.add(model_instance)
-            self.driver.session.commit()
-            id_field = self._id_field(resource)
+        for document, model_instance in zip(doc_or_docs, model_instances):
             document[id_field] = getattr(model_instance, id_field)
             rv.append(document[id_field])
+        self.driver.session.commit()
         return rv
 
     def _create_model_instance(self, resource, dict_):
-        model, _, _, _ = self._datasource_ex(resource)
+        model = self._model(resource)
         attrs = self._get_model_attributes(resource, dict_)
         return model(**attrs)
 
@@ -225,6 +525,8 @@ class SQL(DataLayer):
                 fields[field] = value
         return fields
 
+    @instrumented('replace')
+    @invalidates_results
     def replace(self, resource, id_, document, original):
         model, filter_, fields_, _ = self._datasource_ex(resource, [])
         id_field = self._id_field(resource)
@@ -232,11 +534,25 @@ class SQL(DataLayer):
             filter_, parse_dictionary({id_field: id_}, model))
         query = self.driver.session.query(model)
 
+        replace_mode = self._resource_setting(resource, 'SQL_REPLACE_MODE')
+        if replace_mode not in self.replace_modes:
+            raise ConfigException(
+                'Unknown replace mode \'%s\'' % replace_mode)
+        if replace_mode == 'update' and original is not None and \
+           self._resource_setting(resource, 'SQL_BULK_UPDATE'):
+            values = self._replacement_values(resource, model, document)
+            if values is not None and \
+               supports_bulk_update(model, filter_, values):
+                self._update_in_place(query.filter(*filter_), model,
+                                      id_field, values, original)
+                return
+
         # Find and delete the old object
         old_model_instance = query.filter(*filter_).first()
         if old_model_instance is None:
             abort(500, description=debug_error_message('Object not existent'))
-        self._handle_immutable_id(id_field, old_model_instance, document)
+        self._handle_immutable_id(
+            id_field, getattr(old_model_instance, id_field), document)
         self.driver.session.delete(old_model_instance)
 
         # create and insert the new one
@@ -246,24 +562,84 @@ class SQL(DataLayer):
         self.driver.session.add(model_instance)
         self.driver.session.commit()
 
+    def _replacement_values(self, resource, model, document):
+        """Returns the values to replace the columns of an existing row with
+        `document`, resetting all columns of schema fields missing from the
+        document to their defaults.
+
+        Returns `None` if the document can only be replaced by deleting the
+        old row and inserting a new one, e.g. if a relationship has to be
+        reset or a default is only known to the database.
+        """
+        values = self._get_model_attributes(resource, document)
+        id_field = self._id_field(resource)
+        mapper = inspect(model)
+        schema = self.app.config['DOMAIN'][resource]['schema']
+        for field, field_schema in schema.items():
+            key = field_schema.get('local_id_field', field)
+            if key in values or key == id_field or \
+               field_schema.get('readonly'):
+                continue
+            prop = mapper.attrs.get(key)
+            if prop is None:
+                if key in mapper.all_orm_descriptors:
+                    return None
+                continue
+            if not isinstance(prop, ColumnProperty):
+                return None
+            try:
+                values[key] = column_default(prop.columns[0])
+            except ValueError:
+                return None
+        return values
+
+    @instrumented('update')
+    @invalidates_results
     def update(self, resource, id_, updates, original):
         model, filter_, _, _ = self._datasource_ex(resource, [])
         id_field = self._id_field(resource)
         filter_ = self.combine_queries(
             filter_, parse_dictionary({id_field: id_}, model))
-        query = self.driver.session.query(model)
-        model_instance = query.filter(*filter_).first()
+        query = self.driver.session.query(model).filter(*filter_)
+        attrs = self._get_model_attributes(resource, updates)
+        if original is not None and \
+           self._resource_setting(resource, 'SQL_BULK_UPDATE') and \
+           supports_bulk_update(model, filter_, attrs):
+            self._update_in_place(query, model, id_field, attrs, original)
+            return
+        model_instance = query.first()
         if model_instance is None:
             abort(500, description=debug_error_message('Object not existent'))
-        self._handle_immutable_id(id_field, model_instance, updates)
-        attrs = self._get_model_attributes(resource, updates)
+        self._handle_immutable_id(id_field, getattr(model_instance, id_field),
+                                  updates)
         for k, v in attrs.items():
             setattr(model_instance, k, v)
         self.driver.session.commit()
 
-    def _handle_immutable_id(self, id_field, original_instance, updates):
-        if id_field in updates and \
-           getattr(original_instance, id_field) != updates[id_field]:
+    def _update_in_place(self, query, model, id_field, attrs, original):
+        """Updates a document with a single UPDATE statement, which also
+        verifies that the document has not been changed since `original` was
+        read, if etags are stored.
+        """
+        self._handle_immutable_id(id_field, original.get(id_field), attrs)
+        etag = self.app.config['ETAG']
+        etag_attr = getattr(model, etag, None)
+        update_query = query
+        if original.get(etag) is not None and \
+           isinstance(getattr(etag_attr, 'property', None), ColumnProperty):
+            # Documents without a stored etag get one computed by Eve.
+            update_query = query.filter(sqla_exp.or_(
+                etag_attr.is_(None), etag_attr == original[etag]))
+        if update_query.update(attrs, synchronize_session=False):
+            self.driver.session.commit()
+        elif self.driver.session.query(query.exists()).scalar():
+            abort(412, description=debug_error_message(
+                'Client and server etags don\'t match'))
+        else:
+            abort(500, description=debug_error_message('Object not existent'))
+
+    def _handle_immutable_id(self, id_field, original_id, updates):
+        if id_field in updates and original_id != updates[id_field]:
             description = \
                 "Attempt to update an immutable field. Usually happens " \
                 "when PATCH or PUT include a '%s' field, " \
@@ -271,6 +647,8 @@ class SQL(DataLayer):
                 "it is unchanged)." % id_field
             abort(400, description=description)
 
+    @instrumented('remove')
+    @invalidates_results
     def remove(self, resource, lookup):
         model, filter_, _, _ = self._datasource_ex(resource, [])
         lookup = rename_relationship_fields_in_dict(model, lookup)
@@ -279,11 +657,185 @@ class SQL(DataLayer):
         query = self.driver.session.query(model)
         if len(filter_):
             query = query.filter(*filter_)
-        for item in query:
-            self.driver.session.delete(item)
+        if supports_bulk_delete(model, filter_):
+            query.delete(synchronize_session=False)
+        else:
+            # Delete the items through the ORM, but without loading all of
+            # them at once.
+            chunk_size = self.app.config['SQL_DELETE_CHUNK_SIZE']
+            while True:
+                items = query.limit(chunk_size).all()
+                for item in items:
+                    self.driver.session.delete(item)
+                self.driver.session.flush()
+                if len(items) < chunk_size:
+                    break
 
         self.driver.session.commit()
 
+    def _keyset_sort(self, resource, model, sort):
+        """Returns the sort arguments to be used for keyset pagination.
+
+        Only plain columns of the resource's model can be used as keys. The
+        `id_field` is appended as a tie-breaker if it is not sorted on already,
+        so the resulting order is always total.
+        """
+        result = []
+        for s in sort or []:
+            key, order = s[0], s[1] if len(s) > 1 else 1
+            attr = getattr(model, key, None)
+            if len(s) > 2 or \
+               not isinstance(getattr(attr, 'property', None), ColumnProperty):
+                abort(400, description=debug_error_message(
+                    'Sorting by \'%s\' is not supported with keyset '
+                    'pagination' % key))
+            result.append((key, order))
+        id_field = self._id_field(resource)
+        if id_field not in [key for key, _ in result]:
+            result.append((id_field, 1))
+        return result
+
+    def _keyset_filter(self, model, keyset, after):
+        """Returns the condition selecting the rows following the client's
+        `after` cursor token.
+        """
+        try:
+            keys, values = decode_cursor(after)
+        except ValueError:
+            abort(400, description=debug_error_message(
+                'Unable to parse `%s` cursor' %
+                self.app.config['SQL_QUERY_AFTER']))
+        if keys != [key for key, _ in keyset]:
+            abort(400, description=debug_error_message(
+                'The `%s` cursor does not match the requested sort' %
+                self.app.config['SQL_QUERY_AFTER']))
+        return parse_keyset(model, keyset, values)
+
+    def _client_after(self, req):
+        """Returns the keyset pagination cursor sent by the client, if any.
+
+        :param req: a :class:`ParsedRequest` instance.
+        """
+        if req and req.args:
+            return req.args.get(self.app.config['SQL_QUERY_AFTER'])
+        return None
+
+    def result_cache_info(self):
+        """Returns the number of hits and misses of the result cache and
+        its hit ratio, along with the statistics of its backend if
+        available."""
+        hits = self._result_cache_stats['hits']
+        misses = self._result_cache_stats['misses']
+        info = {'hits': hits, 'misses': misses,
+                'hit_ratio': float(hits) / (hits + misses)
+                if hits + misses else None}
+        if hasattr(self._result_cache, 'info'):
+            info['backend'] = self._result_cache.info()
+        return info
+
+    def _result_key(self, resource, req, sub_resource_lookup):
+        """Returns the key of the cached result of a collection request. It
+        includes the current generation of all tables the documents of the
+        resource are rendered from, so writes to them invalidate it.
+        """
+        def normalized(value):
+            try:
+                return json.loads(value) if value else None
+            except ValueError:
+                return value.strip()
+
+        parts = {
+            'where': normalized(req.where),
+            'sort': req.sort,
+            'projection': normalized(req.projection),
+            'embedded': normalized(req.embedded),
+            'page': req.page,
+            'max_results': req.max_results,
+            'if_modified_since': req.if_modified_since,
+            'after': self._client_after(req),
+            'lookup': sub_resource_lookup,
+            'auth': g.get('auth_value'),
+            'generations': [self._result_generation(table)
+                            for table in self._result_dependencies(resource)],
+        }
+        digest = hashlib.sha1(json.dumps(
+            parts, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+        return 'eve_sqlalchemy:result:%s:%s' % (resource, digest)
+
+    def _result_generation(self, table, new=False):
+        """Returns the token identifying the current state of a table in the
+        result cache, creating a new one if there is none or `new` is set.
+        """
+        key = 'eve_sqlalchemy:generation:%s' % table
+        generation = None if new else self._result_cache.get(key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            self._result_cache.set(key, generation)
+        return generation
+
+    def _result_dependencies(self, resource):
+        """Returns the names of the tables of the model of `resource` and of
+        all models related to it, including association tables."""
+        tables = self._result_tables.get(resource)
+        if tables is None:
+            mapper = inspect(self._model(resource))
+            tables = set(mapper.tables)
+            for prop in mapper.relationships:
+                tables.update(prop.mapper.tables)
+                if prop.secondary is not None:
+                    tables.add(prop.secondary)
+            tables = sorted(t.fullname for t in tables)
+            self._result_tables[resource] = tables
+        return tables
+
+    def _invalidate_results(self, resource):
+        """Invalidates the cached results of all resources depending on the
+        tables written by a write to `resource`, which, due to cascades,
+        include the tables of related models."""
+        config = self.app.config
+        if not config['SQL_RESULT_CACHE'] and \
+           not any(settings.get('sql_result_cache')
+                   for settings in config['DOMAIN'].values()):
+            return
+        for table in self._result_dependencies(resource):
+            self._result_generation(table, new=True)
+
+    def _column_plan(self, resource, model, fields):
+        """Returns the cached :func:`column_plan` of `resource` for rendering
+        `fields`. The plan depends on `IF_MATCH`, which may change at runtime.
+        """
+        key = (resource, tuple(fields), self.app.config.get('IF_MATCH', True))
+        plan = self._column_plans.get(key)
+        if plan is None:
+            plan = column_plan(model, fields) or ()
+            self._column_plans.set(key, plan)
+        return plan
+
+    def _load_options(self, model, fields, embedded=()):
+        """Returns the query options deferring all columns of `model` which
+        are not required to render `fields` and eagerly loading projected
+        relationships as well as the `embedded` ones.
+        """
+        columns = projected_columns(model, fields)
+        options = [load_only(*columns)] if columns else []
+        return options + relationship_load_options(
+            model, list(fields) + list(embedded))
+
+    def _embedded_paths(self, client_embedded):
+        """Returns the sorted paths of the fields to embed as a tuple."""
+        if not isinstance(client_embedded, dict):
+            return ()
+        return tuple(sorted(k for k, v in client_embedded.items() if v))
+
+    def _resource_setting(self, resource, setting):
+        """Returns the value of a setting for the given resource.
+
+        Resource-level settings use the lowercase name of the global setting
+        and take precedence over it.
+        """
+        config = self.driver.app.config
+        return config['DOMAIN'][resource].get(setting.lower(), config[setting])
+
     def _source(self, resource):
         return self.driver.app.config['SOURCES'][resource]['source']
 
@@ -342,16 +894,15 @@ class SQL(DataLayer):
     def combine_queries(self, query_a, query_b):
         # TODO: dumb concatenation of query lists.
         #       We really need to check for duplicate queries
-        query_a.extend(query_b)
-        return query_a
+        # The lists may be cached or part of the domain, so they are not
+        # modified.
+        return list(query_a) + list(query_b)
 
     def is_empty(self, resource):
         model, filter_, _, _ = self.datasource(resource)
-        query = self.driver.session.query(model)
-        if len(filter_):
-            return query.filter_by(*filter_).count() == 0
-        else:
-            return query.count() == 0
+        # EXISTS stops at the first matching row instead of counting them all.
+        query = self.driver.session.query(model).filter(*filter_)
+        return not self.driver.session.query(query.exists()).scalar()
 
     def _client_embedded(self, req):
         """ Returns a properly parsed client embeddable if available.
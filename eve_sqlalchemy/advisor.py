@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+    Suggests missing indexes based on the domain's settings and the shapes of
+    the filters observed at runtime.
+
+    :license: BSD, see LICENSE for more details.
+"""
+from __future__ import unicode_literals
+
+import collections
+import threading
+
+from sqlalchemy import Column, func, inspect, select
+from sqlalchemy.exc import NoSuchTableError
+from sqlalchemy.orm import ColumnProperty, RelationshipProperty
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BooleanClauseList
+
+_equality_operators = (operators.eq, operators.in_op, operators.is_)
+_range_operators = (operators.gt, operators.ge, operators.lt, operators.le,
+                    operators.between_op, operators.like_op,
+                    operators.startswith_op)
+
+IndexSuggestion = collections.namedtuple(
+    'IndexSuggestion', 'table columns reasons frequency rows ddl')
+
+
+class FilterShapeLog(object):
+    """Counts the shapes of the queries of the data layer, i.e. the columns
+    of a table compared for equality, the columns compared by range and the
+    columns sorted by. The data layer records into its own log,
+    `app.data.filter_shapes`, if `SQL_RECORD_FILTER_SHAPES` is set.
+
+    :param maxsize: maximum number of distinct shapes recorded
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, model, conditions, sort=()):
+        """Records the shape of a query of `model` filtered by `conditions`
+        and sorted by `sort`, a list of `(key, order, ...)` tuples."""
+        table = inspect(model).local_table
+        equality, ranges = _conditions_columns(table, conditions)
+        sort_columns = []
+        for sort_key in sort or ():
+            columns = _field_columns(model, sort_key[0])
+            if not columns:
+                break
+            sort_columns.extend(c.name for c in columns)
+        if not (equality or ranges or sort_columns):
+            return
+        shape = (table, tuple(sorted(equality)), tuple(sorted(ranges)),
+                 tuple(sort_columns))
+        with self._lock:
+            if shape in self._counts or len(self._counts) < self.maxsize:
+                self._counts[shape] += 1
+
+    def items(self):
+        """Returns the recorded `((table, equality, ranges, sort), count)`
+        tuples."""
+        with self._lock:
+            return list(self._counts.items())
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+def advise(app, shapes=None, count_rows=True):
+    """Returns a list of :class:`IndexSuggestion` for the indexes missing in
+    the database of `app`, most promising first.
+
+    The candidates are derived from the `item_lookup_field`, the
+    `additional_lookup`, the relationships, the `allowed_filters` and the
+    `default_sort` of each resource as well as the query shapes recorded in
+    `shapes`, the :class:`FilterShapeLog` of `app`'s data layer by default.
+    A candidate is missing unless the columns of an index, unique
+    constraint or primary key reflected from the database start with its
+    columns. Suggestions are ranked by the number of recorded queries they
+    would serve times the number of rows of the table (if `count_rows` is
+    set), a rough estimate of the cost of scanning the table.
+    """
+    if shapes is None:
+        shapes = app.data.filter_shapes
+    candidates = collections.OrderedDict()
+
+    def add(table, columns, reason, frequency=0):
+        if not columns:
+            return
+        key = (table, tuple(c.name if isinstance(c, Column) else c
+                            for c in columns))
+        candidate = candidates.setdefault(
+            key, {'reasons': [], 'frequency': 0})
+        if reason not in candidate['reasons']:
+            candidate['reasons'].append(reason)
+        candidate['frequency'] += frequency
+
+    domain = app.config['DOMAIN']
+    with app.app_context():
+        for resource, settings in domain.items():
+            try:
+                model = app.data._model(resource)
+            except KeyError:
+                continue
+            table = inspect(model).local_table
+            id_field = settings.get('id_field')
+            lookup_field = settings.get('item_lookup_field')
+            if lookup_field and lookup_field != id_field:
+                add(table, _field_columns(model, lookup_field), 'item lookup')
+            additional_lookup = settings.get('additional_lookup') or {}
+            if additional_lookup.get('field'):
+                add(table, _field_columns(model, additional_lookup['field']),
+                    'additional lookup')
+            for prop in inspect(model).relationships:
+                if prop.secondary is not None:
+                    continue
+                for local, remote in prop.local_remote_pairs:
+                    if local.foreign_keys and local.table is table:
+                        add(table, [local], 'relationship')
+                    elif remote.foreign_keys:
+                        add(remote.table, [remote], 'relationship')
+            allowed_filters = settings.get('allowed_filters') or []
+            if '*' not in allowed_filters:
+                for field in allowed_filters:
+                    add(table, _field_columns(model, field), 'allowed filter')
+            sort_columns = []
+            for sort_key in settings.get('default_sort') or []:
+                columns = _field_columns(model, sort_key[0])
+                if not columns:
+                    break
+                sort_columns.extend(columns)
+            add(table, sort_columns, 'default sort')
+
+        for (table, equality, ranges, sort), count in shapes.items():
+            columns = list(equality) + (list(ranges[:1]) if ranges
+                                        else list(sort))
+            add(table, columns, 'observed query', count)
+
+        suggestions = []
+        existing = {}
+        for (table, columns), candidate in candidates.items():
+            if any(other[0] is table and other[1] != columns and
+                   other[1][:len(columns)] == columns
+                   for other in candidates):
+                # A longer candidate for the same table serves this one.
+                continue
+            engine = app.data.driver.get_engine(
+                app, bind=table.info.get('bind_key'))
+            if table not in existing:
+                existing[table] = _reflect_indexes(engine, table)
+            if existing[table] is None or \
+               any(index[:len(columns)] == columns
+                   for index in existing[table]):
+                continue
+            reasons, frequency = _merge_prefixes(candidates, table, columns)
+            rows = _count_rows(engine, table) if count_rows else None
+            suggestions.append(IndexSuggestion(
+                table.fullname, columns, reasons, frequency, rows,
+                _create_index_ddl(engine.dialect, table, columns)))
+    suggestions.sort(key=lambda s: (max(s.frequency, 1) * (s.rows or 1),
+                                    s.frequency), reverse=True)
+    return suggestions
+
+
+def format_report(suggestions):
+    """Renders suggestions as an SQL script, explaining each index in a
+    comment."""
+    lines = []
+    for n, s in enumerate(suggestions, 1):
+        details = ', '.join(s.reasons)
+        if s.frequency:
+            details += '; %d queries' % s.frequency
+        if s.rows is not None:
+            details += '; %d rows' % s.rows
+        lines.append('-- %d. %s (%s): %s' % (
+            n, s.table, ', '.join(s.columns), details))
+        lines.append(s.ddl + ';')
+    return '\n'.join(lines)
+
+
+def _merge_prefixes(candidates, table, columns):
+    reasons = []
+    frequency = 0
+    for (other_table, other_columns), candidate in candidates.items():
+        if other_table is table and \
+           columns[:len(other_columns)] == other_columns:
+            reasons.extend(r for r in candidate['reasons']
+                           if r not in reasons)
+            frequency += candidate['frequency']
+    return reasons, frequency
+
+
+def _field_columns(model, field):
+    """Returns the columns of `model`'s table a field is stored in, an empty
+    list for fields not stored in it."""
+    if '.' in field:
+        return []
+    prop = inspect(model).attrs.get(field)
+    table = inspect(model).local_table
+    if isinstance(prop, ColumnProperty):
+        columns = prop.columns
+    elif isinstance(prop, RelationshipProperty) and \
+            prop.secondary is None and not prop.uselist:
+        columns = prop.local_columns
+    else:
+        return []
+    if not all(isinstance(c, Column) and c.table is table for c in columns):
+        return []
+    return list(columns)
+
+
+def _conditions_columns(table, conditions):
+    """Returns the names of the columns of `table` compared for equality and
+    by range in the conjunction of `conditions`."""
+    equality, ranges = set(), set()
+    stack = list(conditions)
+    while stack:
+        condition = stack.pop()
+        if isinstance(condition, BooleanClauseList):
+            if condition.operator is operators.and_:
+                stack.extend(condition.clauses)
+            continue
+        if not isinstance(condition, BinaryExpression):
+            continue
+        column = condition.left
+        if not isinstance(column, Column) or column.table is not table:
+            continue
+        if condition.operator in _equality_operators:
+            equality.add(column.name)
+        elif condition.operator in _range_operators:
+            ranges.add(column.name)
+    return equality, ranges - equality
+
+
+def _reflect_indexes(engine, table):
+    """Returns the column names of the indexes, unique constraints and
+    primary key of `table` as tuples, or None if the table does not
+    exist."""
+    inspector = inspect(engine)
+    try:
+        pk = inspector.get_pk_constraint(table.name, schema=table.schema)
+        indexes = inspector.get_indexes(table.name, schema=table.schema)
+        try:
+            uniques = inspector.get_unique_constraints(table.name,
+                                                       schema=table.schema)
+        except NotImplementedError:
+            uniques = []
+    except NoSuchTableError:
+        return None
+    result = [tuple(pk.get('constrained_columns') or ())]
+    result.extend(tuple(i['column_names']) for i in indexes)
+    result.extend(tuple(u['column_names']) for u in uniques)
+    return result
+
+
+def _count_rows(engine, table):
+    return engine.execute(select([func.count()]).select_from(table)).scalar()
+
+
+def _create_index_ddl(dialect, table, columns):
+    preparer = dialect.identifier_preparer
+    name = 'ix_%s_%s' % (table.name, '_'.join(columns))
+    max_length = getattr(dialect, 'max_identifier_length', None) or 63
+    name = name[:max_length]
+    return 'CREATE INDEX %s ON %s (%s)' % (
+        preparer.quote(name), preparer.format_table(table),
+        ', '.join(preparer.quote(c) for c in columns))
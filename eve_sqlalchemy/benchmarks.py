@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+    Reproducible benchmarks of the SQLAlchemy data layer on SQLite, based on
+    the models of the `simple` example. Run them with::
+
+        python -m eve_sqlalchemy.benchmarks --people 10000 --fan-out 5
+
+    The results are written as JSON to compare releases.
+
+    :license: BSD, see LICENSE for more details.
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import collections
+import copy
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import eve
+import sqlalchemy
+
+from eve_sqlalchemy import SQL, __version__
+from eve_sqlalchemy.examples.simple import settings as example_settings
+from eve_sqlalchemy.examples.simple.tables import Base, Invoices, People
+from eve_sqlalchemy.validation import ValidatorSQL
+
+timer = getattr(time, 'perf_counter', time.time)
+
+LASTNAMES = ['Anderson', 'Baker', 'Clark', 'Davis', 'Evans', 'Fisher',
+             'Garcia', 'Harris', 'Jackson', 'King', 'Lewis', 'Miller']
+FIRSTNAMES = ['Alice', 'Bob', 'Carol', 'Dave', 'Erin', 'Frank', 'Grace',
+              'Heidi', 'Ivan', 'Judy', 'Mallory', 'Oscar', 'Peggy', 'Trent']
+
+BULK_SIZE = 100
+
+
+def create_app(database_uri='sqlite://', **settings):
+    """Returns an app serving the `simple` example's resources from the
+    given database, with all methods enabled and query statistics
+    recorded."""
+    domain = copy.deepcopy(example_settings.DOMAIN)
+    domain['people']['resource_methods'] = ['GET', 'POST', 'DELETE']
+    domain['invoices']['schema']['people']['data_relation']['embeddable'] = \
+        True
+    config = {
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'RESOURCE_METHODS': ['GET', 'POST', 'DELETE'],
+        'ITEM_METHODS': ['GET', 'PATCH', 'PUT', 'DELETE'],
+        'IF_MATCH': False,
+        'SQL_INSTRUMENTATION': True,
+        'DOMAIN': domain,
+    }
+    config.update(settings)
+    SQL.driver.Model = Base
+    app = eve.Eve(settings=config, data=SQL, validator=ValidatorSQL)
+    with app.app_context():
+        app.data.driver.drop_all()
+        app.data.driver.create_all()
+    return app
+
+
+def generate_data(app, people=1000, fan_out=5, seed=0):
+    """Fills the database with `people` people with `fan_out` invoices
+    each. The data only depends on the arguments."""
+    rng = random.Random(seed)
+    session = app.data.driver.session
+    with app.app_context():
+        for start in range(1, people + 1, 1000):
+            stop = min(start + 1000, people + 1)
+            session.execute(People.__table__.insert(), [
+                {'id': k, 'firstname': rng.choice(FIRSTNAMES),
+                 'lastname': rng.choice(LASTNAMES)}
+                for k in range(start, stop)])
+            session.execute(Invoices.__table__.insert(), [
+                {'number': rng.randint(10000, 99999), 'people_id': k}
+                for k in range(start, stop) for _ in range(fan_out)])
+        session.commit()
+
+
+def _get(path):
+    return lambda client, ctx: client.get(path(ctx) if callable(path)
+                                          else path)
+
+
+def _deep_page(ctx):
+    pages = max(ctx['people'] // ctx['page_size'], 1)
+    return '/people?page=%d' % ctx['rng'].randint(max(pages - 10, 1), pages)
+
+
+def _bulk_post(client, ctx):
+    rng = ctx['rng']
+    return client.post('/invoices', data=json.dumps([
+        {'number': rng.randint(10000, 99999),
+         'people': rng.randint(1, ctx['people'])}
+        for _ in range(BULK_SIZE)]), content_type='application/json')
+
+
+def _patch(client, ctx):
+    id_ = ctx['rng'].randint(1, ctx['people'])
+    return client.patch('/people/%d' % id_, content_type='application/json',
+                        data=json.dumps({'firstname': 'Patched'}))
+
+
+def _put(client, ctx):
+    rng = ctx['rng']
+    id_ = rng.randint(1, ctx['people'])
+    return client.put('/people/%d' % id_, content_type='application/json',
+                      data=json.dumps({'firstname': rng.choice(FIRSTNAMES),
+                                       'lastname': rng.choice(LASTNAMES)}))
+
+
+def _delete(client, ctx):
+    # Each invoice can only be deleted once.
+    return client.delete('/invoices/%d' % ctx['invoice_ids'].pop())
+
+
+scenarios = collections.OrderedDict([
+    ('collection', _get('/people')),
+    ('collection_filter', _get(
+        lambda ctx: '/people?where={"lastname": "%s"}' %
+        ctx['rng'].choice(LASTNAMES))),
+    ('collection_sort', _get('/people?sort=lastname,-firstname')),
+    ('collection_deep_page', _get(_deep_page)),
+    ('collection_embedded', _get('/invoices?embedded={"people": 1}')),
+    ('item', _get(lambda ctx: '/people/%d' %
+                  ctx['rng'].randint(1, ctx['people']))),
+    ('bulk_post', _bulk_post),
+    ('patch', _patch),
+    ('put', _put),
+    ('delete', _delete),
+])
+
+
+def percentile(values, p):
+    """Returns the `p`-th percentile of sorted `values` (nearest rank)."""
+    if not values:
+        return None
+    index = max(int(round(p / 100.0 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def run_scenario(app, scenario, ctx, iterations=100, warmup=10):
+    """Runs a scenario and returns its throughput, latency percentiles and
+    statements per request."""
+    stats = []
+    app.config['SQL_INSTRUMENTATION_SINK'] = stats.append
+    client = app.test_client()
+    for _ in range(warmup):
+        scenario(client, ctx)
+    del stats[:]
+    latencies = []
+    errors = 0
+    for _ in range(iterations):
+        start = timer()
+        response = scenario(client, ctx)
+        latencies.append(timer() - start)
+        if response.status_code >= 400:
+            errors += 1
+    app.config['SQL_INSTRUMENTATION_SINK'] = None
+    latencies.sort()
+    statements = [s.statements for s in stats]
+    total = sum(latencies)
+    return collections.OrderedDict([
+        ('iterations', iterations),
+        ('errors', errors),
+        ('throughput', iterations / total if total else None),
+        ('latency_ms', collections.OrderedDict(
+            (name, value * 1000 if value is not None else None)
+            for name, value in [
+                ('mean', total / iterations if iterations else None),
+                ('p50', percentile(latencies, 50)),
+                ('p90', percentile(latencies, 90)),
+                ('p99', percentile(latencies, 99)),
+                ('max', latencies[-1] if latencies else None)])),
+        ('statements', collections.OrderedDict([
+            ('mean', float(sum(statements)) / len(statements)
+             if statements else None),
+            ('max', max(statements) if statements else None)])),
+    ])
+
+
+def run(database_uri='sqlite://', people=1000, fan_out=5, iterations=100,
+        warmup=10, seed=0, names=None):
+    """Generates the data and runs the scenarios given by `names` (all by
+    default), returning the results as a dict."""
+    app = create_app(database_uri)
+    generate_data(app, people, fan_out, seed)
+    ctx = {'rng': random.Random(seed), 'people': people,
+           'page_size': app.config['PAGINATION_DEFAULT'],
+           'invoice_ids': list(range(1, people * fan_out + 1))}
+    results = collections.OrderedDict()
+    for name, scenario in scenarios.items():
+        if names and name not in names:
+            continue
+        count = iterations
+        if name == 'delete':
+            count = max(min(iterations, len(ctx['invoice_ids']) - warmup), 0)
+        results[name] = run_scenario(app, scenario, ctx, count, warmup)
+    return collections.OrderedDict([
+        ('eve_sqlalchemy', __version__),
+        ('eve', eve.__version__),
+        ('sqlalchemy', sqlalchemy.__version__),
+        ('python', platform.python_version()),
+        ('database', database_uri),
+        ('people', people),
+        ('fan_out', fan_out),
+        ('seed', seed),
+        ('scenarios', results),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m eve_sqlalchemy.benchmarks',
+        description='Benchmarks the SQLAlchemy data layer on SQLite.')
+    parser.add_argument('--database', default=None,
+                        help='SQLite file to use (recreated), in-memory '
+                             'database by default')
+    parser.add_argument('--people', type=int, default=1000,
+                        help='number of rows of the people table')
+    parser.add_argument('--fan-out', type=int, default=5,
+                        help='number of invoices per person')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', dest='names',
+                        choices=list(scenarios),
+                        help='scenario to run (repeatable), all by default')
+    parser.add_argument('--output', default='-',
+                        help='file to write the JSON results to')
+    args = parser.parse_args(argv)
+    database_uri = 'sqlite:///%s' % os.path.abspath(args.database) \
+        if args.database else 'sqlite://'
+    results = run(database_uri, args.people, args.fan_out, args.iterations,
+                  args.warmup, args.seed, args.names)
+    output = json.dumps(results, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
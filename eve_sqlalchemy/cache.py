@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+    Simple in-process caches used by the SQLAlchemy data layer.
+
+    :license: BSD, see LICENSE for more details.
+"""
+from __future__ import unicode_literals
+
+import collections
+import threading
+import time
+
+
+class LRUCache(object):
+    """A thread-safe, size-bounded mapping discarding the least recently used
+    entries first. Entries can optionally expire after `ttl` seconds.
+
+    :param maxsize: maximum number of entries
+    :param ttl: default time to live of entries in seconds, `None` means
+                entries never expire
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires < time.time():
+                self._removed(value)
+                self.misses += 1
+                return default
+            self._data[key] = (value, expires)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._removed(old[0])
+            self._data[key] = (value, expires)
+            self._added(value)
+            while self._data and self._full():
+                self._removed(self._data.popitem(last=False)[1][0])
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._removed(old[0])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._cleared()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Returns the cache statistics as a dictionary."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': float(self.hits) / lookups if lookups
+                    else None,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+    def _full(self):
+        return len(self._data) > self.maxsize
+
+    def _added(self, value):
+        pass
+
+    def _removed(self, value):
+        pass
+
+    def _cleared(self):
+        pass
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SizedLRUCache(LRUCache):
+    """An :class:`LRUCache` which is also bounded by the total size of its
+    values in bytes, as computed by `sizeof`. The default, `len`, suits
+    strings.
+
+    :param maxbytes: maximum total size of the values
+    :param maxsize: maximum number of entries
+    :param ttl: default time to live of entries in seconds
+    :param sizeof: function returning the size of a value
+    """
+
+    def __init__(self, maxbytes=64 * 1024 * 1024, maxsize=100000, ttl=None,
+                 sizeof=len):
+        super(SizedLRUCache, self).__init__(maxsize, ttl)
+        self.maxbytes = maxbytes
+        self.bytes = 0
+        self._sizeof = sizeof
+
+    def info(self):
+        info = super(SizedLRUCache, self).info()
+        info.update(bytes=self.bytes, maxbytes=self.maxbytes)
+        return info
+
+    def _full(self):
+        return self.bytes > self.maxbytes or \
+            super(SizedLRUCache, self)._full()
+
+    def _added(self, value):
+        self.bytes += self._sizeof(value)
+
+    def _removed(self, value):
+        self.bytes -= self._sizeof(value)
+
+    def _cleared(self):
+        self.bytes = 0
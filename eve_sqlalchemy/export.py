@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+    Streaming export of whole collections as NDJSON or CSV.
+
+    :license: BSD, see LICENSE for more details.
+"""
+from __future__ import unicode_literals
+
+import simplejson as json
+from eve.auth import requires_auth
+from eve.utils import parse_request
+from flask import (
+    Response, abort, current_app as app, request, stream_with_context,
+)
+
+try:
+    string_type = basestring
+except NameError:
+    # Python 3
+    string_type = str
+
+formats = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export(resource):
+    """Flask view streaming all documents of `resource` matching the
+    `where`, `sort` and `projection` arguments of the request, just like a
+    `GET` of the collection but without pagination. The format is chosen by
+    the `format` argument, `ndjson` (the default) or `csv`. Related
+    documents are written as their ids, embedding them is not supported.
+
+    The documents are written as soon as they are fetched in batches of
+    `SQL_EXPORT_BATCH_SIZE` rows, so memory usage is constant. Register the
+    view with e.g.::
+
+        app.add_url_rule('/export/<resource>', view_func=export)
+    """
+    resource_def = app.config['DOMAIN'].get(resource)
+    if resource_def is None or resource_def.get('internal_resource') or \
+       'GET' not in resource_def['resource_methods']:
+        abort(404)
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in formats:
+        abort(400, description='Unknown export format \'%s\'' % fmt)
+    if request.args.get(app.config['QUERY_EMBEDDED']):
+        abort(400, description='Embedding is not supported by exports')
+    return _export(resource, fmt)
+
+
+@requires_auth('resource')
+def _export(resource, fmt):
+    collection = app.data.export(resource, parse_request(resource))
+    documents = collection.stream(app.config['SQL_EXPORT_BATCH_SIZE'])
+    encoder = app.data.json_encoder_class
+    if fmt == 'csv':
+        lines = csv_lines(documents, encoder)
+    else:
+        lines = ndjson_lines(documents, encoder)
+    return Response(stream_with_context(lines), mimetype=formats[fmt])
+
+
+def ndjson_lines(documents, encoder=None):
+    """Yields each document as a line of JSON."""
+    for document in documents:
+        yield json.dumps(document, cls=encoder) + '\n'
+
+
+def csv_lines(documents, encoder=None):
+    """Yields a header line followed by a line per document, as CSV.
+
+    The columns are the sorted fields of the first document. Embedded
+    documents and lists are written as JSON.
+    """
+    keys = None
+    for document in documents:
+        if keys is None:
+            keys = sorted(document)
+            yield _csv_line(keys)
+        yield _csv_line([_csv_value(document.get(key), encoder)
+                         for key in keys])
+
+
+def _csv_value(value, encoder):
+    if value is None:
+        return ''
+    if isinstance(value, string_type):
+        return value
+    value = json.dumps(value, cls=encoder)
+    if value.startswith('"'):
+        # e.g. a date rendered as a string according to `DATE_FORMAT`
+        value = json.loads(value)
+    return value
+
+
+def _csv_line(values):
+    return ','.join(
+        '"%s"' % v.replace('"', '""') if any(c in v for c in ',"\r\n') else v
+        for v in values) + '\r\n'
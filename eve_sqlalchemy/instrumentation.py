@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+    Per-request statistics of the queries issued by the SQLAlchemy data
+    layer and a log of slow queries.
+
+    :license: BSD, see LICENSE for more details.
+"""
+from __future__ import unicode_literals
+
+import collections
+import contextlib
+import functools
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+headers = collections.OrderedDict([
+    ('X-SQL-Statements', lambda s: '%d' % s.statements),
+    ('X-SQL-Time', lambda s: '%.3f' % (s.time * 1000)),
+    ('X-SQL-Rows', lambda s: '%d' % s.rows),
+    ('X-SQL-Instances', lambda s: '%d' % s.instances),
+])
+
+explain_prefixes = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+
+class QueryStats(object):
+    """Counts the statements executed, the time spent executing them in
+    seconds, the rows fetched by the data layer and the ORM instances loaded
+    from rows. `operations` holds the same statistics per
+    `(resource, operation)` the data layer was performing, with `operation`
+    being one of `find`, `find_one`, `insert`, `update`, `replace` or
+    `remove`.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.time = 0.0
+        self.rows = 0
+        self.instances = 0
+        self.operations = collections.OrderedDict()
+        self._tags = []
+
+    def _add(self, **counts):
+        targets = [self]
+        if self._tags:
+            tag = self._tags[-1]
+            if tag not in self.operations:
+                self.operations[tag] = QueryStats()
+            targets.append(self.operations[tag])
+        for target in targets:
+            for key, value in counts.items():
+                setattr(target, key, getattr(target, key) + value)
+
+    def as_dict(self):
+        result = {'statements': self.statements, 'time': self.time,
+                  'rows': self.rows, 'instances': self.instances}
+        if self.operations:
+            result['operations'] = [
+                dict(stats.as_dict(), resource=resource, operation=operation)
+                for (resource, operation), stats in self.operations.items()]
+        return result
+
+
+def init_app(app):
+    """Records :class:`QueryStats` for each request of `app` in
+    `g.sql_stats`. They are added to the response headers if
+    `SQL_INSTRUMENTATION_HEADERS` is set and passed to the callable
+    `SQL_INSTRUMENTATION_SINK`, if any, at the end of the request.
+
+    Statements taking at least `SQL_SLOW_QUERY_THRESHOLD` seconds are logged
+    as warnings, see :func:`log_slow_query`.
+    """
+    _listen()
+
+    @app.before_request
+    def start():
+        g.sql_stats = QueryStats()
+
+    @app.after_request
+    def add_headers(response):
+        stats = current_stats()
+        if stats is not None and app.config['SQL_INSTRUMENTATION_HEADERS']:
+            for header, render in headers.items():
+                response.headers[header] = render(stats)
+        return response
+
+    @app.teardown_request
+    def finish(exc=None):
+        stats = current_stats()
+        sink = app.config['SQL_INSTRUMENTATION_SINK']
+        if stats is not None and sink is not None:
+            sink(stats)
+
+
+def current_stats():
+    """Returns the :class:`QueryStats` of the current request, or None if
+    it is not instrumented."""
+    if not has_app_context():
+        return None
+    return getattr(g, 'sql_stats', None)
+
+
+@contextlib.contextmanager
+def operation(resource, name):
+    """Attributes the statements executed within the context to the
+    operation `name` on `resource`."""
+    stats = current_stats()
+    if stats is None:
+        yield
+        return
+    tag = (resource, name)
+    stats._tags.append(tag)
+    try:
+        yield
+    finally:
+        # Contexts within generators are not necessarily left in order.
+        for i in range(len(stats._tags) - 1, -1, -1):
+            if stats._tags[i] is tag:
+                del stats._tags[i]
+                break
+
+
+def instrumented(name):
+    """Decorates a method of the data layer taking the resource as its first
+    argument as operation `name`."""
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated(self, resource, *args, **kwargs):
+            with operation(resource, name):
+                return f(self, resource, *args, **kwargs)
+        return decorated
+    return decorator
+
+
+def add_rows(count):
+    """Records `count` rows fetched by the data layer."""
+    stats = current_stats()
+    if stats is not None:
+        stats._add(rows=count)
+
+
+_listening = []
+
+
+def _listen():
+    # The listeners apply to all engines and mappers, but only record
+    # anything within instrumented requests.
+    if _listening:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    event.listen(Mapper, 'load', _load)
+    _listening.append(True)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('sql_stats_start', []).append(time.time())
+
+
+def log_slow_query(conn, statement, parameters, executemany, duration):
+    """Logs a slow statement along with its parameters, the resource and
+    operation of the data layer it was issued by, the `where`, `sort` and
+    `page` arguments of the request and, if `SQL_SLOW_QUERY_EXPLAIN` is set,
+    its query plan.
+    """
+    stats = current_stats()
+    resource, name = stats._tags[-1] if stats and stats._tags \
+        else (None, None)
+    args = ''
+    if has_request_context():
+        args = ' '.join('%s=%s' % (k, request.args[k])
+                        for k in ('where', 'sort', 'page')
+                        if k in request.args)
+    plan = None
+    if current_app.config['SQL_SLOW_QUERY_EXPLAIN'] and not executemany:
+        plan = explain(conn, statement, parameters)
+    current_app.logger.warning(
+        'Slow query (%.3f s) in %s of %s with request args [%s]: %s '
+        'with parameters %r%s', duration, name, resource, args, statement,
+        parameters, '\nQuery plan:\n%s' % plan if plan else '')
+
+
+def explain(conn, statement, parameters):
+    """Returns the query plan of a `SELECT` statement executed on the
+    connection `conn` as text, or None if the database is not supported.
+    `statement` is not executed.
+
+    The plan is captured on a separate connection of the engine, unless its
+    pool hands out the same connection to everyone, as it does for in-memory
+    SQLite databases. Returning that connection to the pool would roll back
+    its transaction, so a cursor of `conn` is used instead; other databases
+    are not explained in that case, as a failing `EXPLAIN` could abort the
+    transaction.
+    """
+    engine = conn.engine
+    prefix = explain_prefixes.get(engine.dialect.name)
+    if prefix is None or \
+       not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    shared = isinstance(engine.pool, (StaticPool, SingletonThreadPool))
+    if shared and engine.dialect.name != 'sqlite':
+        return None
+    connection = conn.connection if shared else engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        return 'EXPLAIN failed: %s' % e
+    finally:
+        if not shared:
+            connection.close()
+    return '\n'.join(' '.join('%s' % v for v in row) for row in rows)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    duration = time.time() - conn.info['sql_stats_start'].pop()
+    stats = current_stats()
+    if stats is None:
+        return
+    stats._add(statements=1, time=duration)
+    threshold = current_app.config.get('SQL_SLOW_QUERY_THRESHOLD')
+    if threshold is not None and duration >= threshold:
+        log_slow_query(conn, statement, parameters, executemany, duration)
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        starts = context.connection.info.get('sql_stats_start')
+        if starts:
+            starts.pop()
+
+
+def _load(target, context):
+    stats = current_stats()
+    if stats is not None:
+        stats._add(instances=1)
@@ -7,8 +7,50 @@
 """
 from __future__ import unicode_literals
 
+import datetime
+import hashlib
+import uuid
 from io import BytesIO
 
+from sqlalchemy import (
+    BigInteger, Column, DateTime, ForeignKey, Integer, LargeBinary, MetaData,
+    String, Table, and_, exists, select,
+)
+from sqlalchemy.exc import IntegrityError
+
+media_metadata = MetaData()
+
+media_files = Table(
+    'eve_media_files', media_metadata,
+    Column('id', String(64), primary_key=True),
+    Column('filename', String(255)),
+    Column('content_type', String(255)),
+    Column('length', BigInteger, nullable=False, default=0),
+    Column('chunk_size', Integer, nullable=False),
+    Column('md5', String(32)),
+    Column('upload_date', DateTime, nullable=False),
+    Column('refcount', Integer, nullable=False, default=1),
+)
+
+media_chunks = Table(
+    'eve_media_chunks', media_metadata,
+    Column('file_id', String(64),
+           ForeignKey('eve_media_files.id', ondelete='CASCADE'),
+           primary_key=True),
+    Column('n', Integer, primary_key=True, autoincrement=False),
+    Column('data', LargeBinary, nullable=False),
+)
+
+media_references = Table(
+    'eve_media_references', media_metadata,
+    Column('id', String(64), primary_key=True),
+    Column('file_id', String(64), ForeignKey('eve_media_files.id'),
+           nullable=False, index=True),
+    Column('filename', String(255)),
+    Column('content_type', String(255)),
+    Column('upload_date', DateTime, nullable=False),
+)
+
 
 class SQLBlobMediaStorage(object):
     """ The MediaStorage class provides a standardized API for storing files,
@@ -58,3 +100,278 @@ class SQLBlobMediaStorage(object):
         for a new file.
         """
         raise NotImplementedError
+
+
+class SQLChunkedMediaStorage(SQLBlobMediaStorage):
+    """ Media storage keeping files split into chunks of
+    `SQL_MEDIA_CHUNK_SIZE` bytes in the `eve_media_files` and
+    `eve_media_chunks` tables, which have to be created using
+    `media_metadata.create_all(engine)`. Media fields store the id of the
+    file, a string of 32 characters.
+
+    Files are written chunk by chunk while reading the upload and read
+    lazily, one chunk at a time, so the memory used per transfer is bounded
+    by the chunk size. As Eve's media endpoint streams the file after the
+    request's session has been removed, the chunks are read on connections
+    of their own.
+    """
+
+    @property
+    def _session(self):
+        return self.app.data.driver.session
+
+    def get(self, id_or_filename, resource=None):
+        """ Returns a :class:`ChunkedMediaFile` reading the file given by its
+        id, or None if no file was found. Files consisting of a single chunk
+        are read right away.
+        """
+        return self._open(
+            select([media_files]).where(media_files.c.id == id_or_filename))
+
+    def _open(self, query):
+        session = self._session
+        row = session.execute(query).first()
+        if row is None:
+            return None
+        chunk = None
+        if row.length <= row.chunk_size:
+            chunk = session.execute(select([media_chunks.c.data]).where(
+                media_chunks.c.file_id == row.id)).scalar() or b''
+        return ChunkedMediaFile(session.get_bind(), row, chunk)
+
+    def put(self, content, filename=None, content_type=None, resource=None):
+        """ Saves a new file in chunks and returns its id. The chunks are
+        written within the current transaction of the session, which is
+        committed along with the document referring to the file.
+        """
+        file_id = uuid.uuid4().hex
+        self._write(file_id, content, filename, content_type)
+        return file_id
+
+    def _write(self, file_id, content, filename, content_type):
+        session = self._session
+        chunk_size = self.app.config['SQL_MEDIA_CHUNK_SIZE']
+        session.execute(media_files.insert(), {
+            'id': file_id,
+            'filename': filename or getattr(content, 'filename', None),
+            'content_type': content_type or getattr(content, 'mimetype', None),
+            'chunk_size': chunk_size,
+            'upload_date': datetime.datetime.utcnow(),
+        })
+        md5 = hashlib.md5()
+        length = 0
+        content.stream.seek(0)
+        for n, data in enumerate(_read_chunks(content.stream, chunk_size)):
+            session.execute(media_chunks.insert(),
+                            {'file_id': file_id, 'n': n, 'data': data})
+            md5.update(data)
+            length += len(data)
+        session.execute(
+            media_files.update().where(media_files.c.id == file_id),
+            {'length': length, 'md5': md5.hexdigest()})
+
+    def delete(self, id_or_filename, resource=None):
+        """ Deletes the file given by its id along with its chunks. """
+        if not id_or_filename:  # there is nothing to remove
+            return
+        session = self._session
+        session.execute(media_chunks.delete().where(
+            media_chunks.c.file_id == id_or_filename))
+        session.execute(media_files.delete().where(
+            media_files.c.id == id_or_filename))
+
+    def exists(self, id_or_filename, resource=None):
+        """ Returns True if a file with the given id exists. """
+        return self._session.execute(select([exists().where(
+            media_files.c.id == id_or_filename)])).scalar()
+
+
+class SQLDeduplicatingMediaStorage(SQLChunkedMediaStorage):
+    """ Chunked media storage identifying the content of a file by its
+    SHA-256 hash, so identical files are only stored once. Each upload is
+    a reference to the stored content in the `eve_media_references` table
+    with its own id, a string of 32 characters, filename, content type and
+    upload date. The content is removed when the last reference to it is
+    deleted.
+    """
+
+    def get(self, id_or_filename, resource=None):
+        """ Returns a :class:`ChunkedMediaFile` reading the file given by the
+        id of its reference, or None if no file was found.
+        """
+        return self._open(select([
+            media_files.c.id, media_files.c.length, media_files.c.chunk_size,
+            media_files.c.md5, media_references.c.filename,
+            media_references.c.content_type, media_references.c.upload_date,
+        ]).select_from(media_references.join(media_files)).where(
+            media_references.c.id == id_or_filename))
+
+    def put(self, content, filename=None, content_type=None, resource=None):
+        """ Saves a new file unless a file with the same content exists, in
+        which case only its reference count is incremented. Returns the id of
+        a new reference to the file.
+        """
+        chunk_size = self.app.config['SQL_MEDIA_CHUNK_SIZE']
+        sha256 = hashlib.sha256()
+        content.stream.seek(0)
+        for data in _read_chunks(content.stream, chunk_size):
+            sha256.update(data)
+        file_id = sha256.hexdigest()
+
+        session = self._session
+        if not self._add_reference(file_id):
+            if session.get_bind().dialect.name == 'sqlite':
+                # SQLite serializes writers and the UPDATE above holds the
+                # lock until the end of the transaction, so no one else can
+                # store the file meanwhile. pysqlite doesn't support
+                # SAVEPOINT properly anyway.
+                self._write(file_id, content, filename, content_type)
+            else:
+                try:
+                    with session.begin_nested():
+                        self._write(file_id, content, filename, content_type)
+                except IntegrityError:
+                    # The same content was stored concurrently.
+                    if not self._add_reference(file_id):
+                        raise
+        reference_id = uuid.uuid4().hex
+        session.execute(media_references.insert(), {
+            'id': reference_id,
+            'file_id': file_id,
+            'filename': filename or getattr(content, 'filename', None),
+            'content_type': content_type or getattr(content, 'mimetype', None),
+            'upload_date': datetime.datetime.utcnow(),
+        })
+        return reference_id
+
+    def _add_reference(self, file_id):
+        return self._session.execute(
+            media_files.update().where(media_files.c.id == file_id)
+            .values(refcount=media_files.c.refcount + 1)).rowcount > 0
+
+    def delete(self, id_or_filename, resource=None):
+        """ Deletes the reference given by its id and the file along with its
+        chunks if it is not referenced anymore.
+        """
+        if not id_or_filename:  # there is nothing to remove
+            return
+        session = self._session
+        file_id = session.execute(select([media_references.c.file_id]).where(
+            media_references.c.id == id_or_filename)).scalar()
+        if file_id is None:
+            return
+        session.execute(media_references.delete().where(
+            media_references.c.id == id_or_filename))
+        session.execute(
+            media_files.update().where(media_files.c.id == file_id)
+            .values(refcount=media_files.c.refcount - 1))
+        unreferenced = select([media_files.c.id]).where(and_(
+            media_files.c.id == file_id, media_files.c.refcount <= 0))
+        session.execute(media_chunks.delete().where(
+            media_chunks.c.file_id.in_(unreferenced)))
+        session.execute(media_files.delete().where(and_(
+            media_files.c.id == file_id, media_files.c.refcount <= 0)))
+
+    def exists(self, id_or_filename, resource=None):
+        """ Returns True if a reference with the given id exists. """
+        return self._session.execute(select([exists().where(
+            media_references.c.id == id_or_filename)])).scalar()
+
+
+class ChunkedMediaFile(object):
+    """ Read-only, seekable file-like object returned by
+    :class:`SQLChunkedMediaStorage`. Chunks are fetched lazily when read,
+    keeping only the current one in memory, so reading a range of the file
+    only fetches the chunks it covers.
+    Iterating over the file yields its remaining content chunk by chunk.
+
+    Chunks are read using connections of the engine `bind`, so the file does
+    not depend on the session or the application context it was opened in.
+    `chunk` is the content of the first chunk if it is already known.
+    """
+
+    def __init__(self, bind, row, chunk=None):
+        self._bind = bind
+        self._id = row.id
+        self.filename = row.filename
+        self.content_type = row.content_type
+        self.length = row.length
+        self.chunk_size = row.chunk_size
+        self.md5 = row.md5
+        self.upload_date = row.upload_date
+        self._position = 0
+        self._chunk = (0, chunk) if chunk is not None else (None, b'')
+
+    def _get_chunk(self, n):
+        if self._chunk[0] != n:
+            data = self._bind.execute(
+                select([media_chunks.c.data]).where(and_(
+                    media_chunks.c.file_id == self._id,
+                    media_chunks.c.n == n))
+            ).scalar()
+            self._chunk = (n, data or b'')
+        return self._chunk[1]
+
+    def read(self, size=-1):
+        remaining = max(self.length - self._position, 0)
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        parts = []
+        while size > 0:
+            n, offset = divmod(self._position, self.chunk_size)
+            data = self._get_chunk(n)[offset:offset + size]
+            if not data:
+                break
+            parts.append(data)
+            self._position += len(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._position
+        elif whence == 2:
+            offset += self.length
+        if offset < 0:
+            raise ValueError('negative seek position %d' % offset)
+        self._position = offset
+        return offset
+
+    def tell(self):
+        return self._position
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self._chunk = (None, b'')
+
+    def __iter__(self):
+        while True:
+            offset = self._position % self.chunk_size
+            data = self.read(self.chunk_size - offset)
+            if not data:
+                return
+            yield data
+
+
+def _read_chunks(stream, chunk_size):
+    """ Yields the content of `stream` in chunks of exactly `chunk_size`
+    bytes, except for the last one. """
+    buffered = []
+    size = 0
+    while True:
+        data = stream.read(chunk_size - size)
+        if not data:
+            break
+        buffered.append(data)
+        size += len(data)
+        if size == chunk_size:
+            yield b''.join(buffered)
+            buffered = []
+            size = 0
+    if buffered:
+        yield b''.join(buffered)
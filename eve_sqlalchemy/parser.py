@@ -10,15 +10,37 @@
 from __future__ import unicode_literals
 
 import ast
+import io
 import itertools
 import json
 import operator as sqla_op
 import re
+import tokenize
 
 import sqlalchemy
 from eve.utils import str_to_date
 from sqlalchemy.ext.associationproxy import AssociationProxy
-from sqlalchemy.sql import expression as sqla_exp
+from sqlalchemy.orm import ColumnProperty
+from sqlalchemy.sql import expression as sqla_exp, visitors
+
+from .cache import LRUCache
+
+try:
+    string_type = basestring
+except NameError:
+    # Python 3
+    string_type = str
+
+# Parsed `where` expressions, keyed by model and the expression with its
+# literals replaced by placeholders.
+filter_cache = LRUCache(maxsize=512)
+
+# A python-like expression can only be a comparison or boolean operation if it
+# contains at least one of these.
+_conditional_re = re.compile(r'[=<>]|\b(?:and|or|in|is)\b')
+
+# Values like `like("%john%")` are parsed as SQLAlchemy operators.
+_sqla_operator_re = re.compile(r"(?P<operator>[\w\s]+)\(+(?P<value>.+)\)+")
 
 
 class ParseError(ValueError):
@@ -41,12 +63,14 @@ def parse_dictionary(filter_dict, model):
 
     for k, v in filter_dict.items():
         # first let's check with the expression parser
-        try:
-            conditions += parse('{0}{1}'.format(k, v), model)
-        except ParseError:
-            pass
-        else:
-            continue
+        expression = '{0}{1}'.format(k, v)
+        if isinstance(v, string_type) and _conditional_re.search(expression):
+            try:
+                conditions += parse(expression, model)
+            except ParseError:
+                pass
+            else:
+                continue
 
         if k in ['and_', 'or_']:
             try:
@@ -118,7 +142,7 @@ def parse_sqla_operators(expression):
         similar to("%(ohn|acob)")
         in("('a','b')")
     """
-    m = re.match(r"(?P<operator>[\w\s]+)\(+(?P<value>.+)\)+", expression)
+    m = _sqla_operator_re.match(expression)
     if m:
         o = m.group('operator')
         v = json.loads(m.group('value'))
@@ -130,17 +154,171 @@ def parse(expression, model):
     Given a python-like conditional statement, returns the equivalent
     SQLAlchemy-like query expression. Conditional and boolean operators
     (==, <=, >=, !=, >, <) are supported.
+
+    Results are cached in :data:`filter_cache` as templates, so expressions
+    only differing in their literal values are parsed just once.
     """
+    key, literals, values = _expression_key(expression)
+    if key is not None:
+        key = (model,) + key
+        template = filter_cache.get(key)
+        if template is not None:
+            return template.render(expression, values)
+
     v = SQLAVisitor(model)
     try:
         parsed_expr = ast.parse(expression)
-    except SyntaxError:
+        v.visit(parsed_expr)
+    except (SyntaxError, ParseError) as e:
+        if key is not None:
+            filter_cache.set(key, _FilterTemplate())
+        if isinstance(e, ParseError):
+            raise
         raise ParseError("Can't parse expression '{0}'".format(expression))
 
-    v.visit(parsed_expr)
+    if key is not None:
+        template = _FilterTemplate.create(v, literals)
+        if template is not None:
+            filter_cache.set(key, template)
     return v.sqla_query
 
 
+def expression_key(expression):
+    """Returns a key identifying the shape of the conditions :func:`parse`
+    returns for `expression`, i.e. expressions with equal keys only differ in
+    the values of their bind parameters. Returns `None` if the expression
+    cannot be tokenized.
+    """
+    return _expression_key(expression)[0]
+
+
+def _expression_key(expression):
+    key, literals = _tokenize_expression(expression)
+    if key is None:
+        return None, None, None
+    # The type of bind parameters may depend on the literal values.
+    values = [_parse_str(literal) if isinstance(literal, string_type)
+              else literal for literal in literals]
+    return (key, tuple(type(v) for v in values)), literals, values
+
+
+def lookup_key(model, lookup):
+    """Returns a key identifying the shape of the conditions
+    :func:`parse_dictionary` returns for `lookup`, or `None` if the shape
+    might depend on more than the names and types of the values.
+
+    Only lookups comparing plain columns to strings and numbers have a key.
+    """
+    key = []
+    for k, v in sorted(lookup.items()):
+        if isinstance(v, bool) or \
+           not isinstance(v, (string_type, int, float)):
+            return None
+        if isinstance(v, string_type) and \
+           (_conditional_re.search('{0}{1}'.format(k, v)) or
+                _sqla_operator_re.match(v)):
+            return None
+        attr = getattr(model, k, None)
+        if not isinstance(getattr(attr, 'property', None), ColumnProperty):
+            return None
+        key.append((k, type(v)))
+    return tuple(key)
+
+
+def parameterize(conditions, prefix='_p'):
+    """Replaces the values of all bind parameters in `conditions` with named
+    bind parameters without a value.
+
+    Returns the new conditions and a dictionary mapping the names of the bind
+    parameters to their values, e.g. to be used with baked queries.
+    """
+    params = {}
+
+    def replace(element):
+        if isinstance(element, sqla_exp.BindParameter):
+            key = '%s%d' % (prefix, len(params))
+            params[key] = element.effective_value
+            return sqla_exp.bindparam(key, type_=element.type,
+                                      expanding=element.expanding)
+
+    conditions = [visitors.replacement_traverse(c, {}, replace)
+                  for c in conditions]
+    return conditions, params
+
+
+def _tokenize_expression(expression):
+    """Returns a tuple of the expression's tokens with string and number
+    literals replaced by placeholders and the list of these literals' values.
+
+    Returns `(None, None)` if the expression cannot be tokenized.
+    """
+    key = []
+    literals = []
+    try:
+        tokens = tokenize.generate_tokens(io.StringIO(expression).readline)
+        for token_type, token_string, _, _, _ in tokens:
+            if token_type in (tokenize.NUMBER, tokenize.STRING):
+                key.append('?%d' % token_type)
+                literals.append(ast.literal_eval(token_string))
+            else:
+                key.append(token_string)
+    except (tokenize.TokenError, SyntaxError, ValueError, TypeError):
+        return None, None
+    return tuple(key), literals
+
+
+def _parse_str(value):
+    try:
+        parsed = str_to_date(value)
+        return parsed if parsed is not None else value
+    except ValueError:
+        return value
+
+
+class _FilterTemplate(object):
+    """A parsed expression whose literal values can be replaced.
+
+    Templates without conditions represent expressions which failed to parse.
+    """
+
+    def __init__(self, conditions=None, bind_keys=None):
+        self.conditions = conditions
+        self.bind_keys = bind_keys
+
+    @classmethod
+    def create(cls, visitor, literals):
+        """Creates a template out of a visitor which parsed an expression
+        containing `literals`. Returns `None` if the literals cannot be
+        mapped to bind parameters of the resulting conditions unambiguously.
+        """
+        if len(visitor.literals) != len(literals):
+            return None
+        bind_keys = []
+        for (raw, value, condition), literal in zip(visitor.literals,
+                                                    literals):
+            bind = getattr(condition, 'right', None)
+            if raw != literal or type(raw) is not type(literal) or \
+               not isinstance(bind, sqla_exp.BindParameter) or \
+               bind.value is not value:
+                return None
+            bind_keys.append(bind.key)
+        # The conditions returned by parse() may be extended by the caller.
+        return cls(list(visitor.sqla_query), bind_keys)
+
+    def render(self, expression, values):
+        if self.conditions is None:
+            raise ParseError("Can't parse expression '{0}'".format(expression))
+        params = dict(zip(self.bind_keys, values))
+
+        def replace(element):
+            if isinstance(element, sqla_exp.BindParameter) and \
+               element.key in params:
+                return element._with_value(params[element.key])
+
+        return [visitors.replacement_traverse(c, {}, replace)
+                for c in self.conditions]
+
+
 def parse_sorting(model, key, order=1, expression=None):
     """Sorting parser that works with embedded resources and sql expressions.
 
@@ -159,6 +337,25 @@ def parse_sorting(model, key, order=1, expression=None):
     return (attr, conditions)
 
 
+def parse_keyset(model, keyset, values):
+    """Keyset pagination parser.
+
+    Given the sort keys used for keyset pagination as a list of `(key, order)`
+    tuples and the values of the last row of the previous page, returns the
+    condition selecting all rows following that row, e.g.:
+
+    (a > :a) OR (a = :a AND b < :b) OR (a = :a AND b = :b AND _id > :_id)
+    """
+    conditions = []
+    for i, (key, order) in enumerate(keyset):
+        op = sqla_op.lt if order == -1 else sqla_op.gt
+        clauses = [sqla_op.eq(getattr(model, k), v)
+                   for (k, _), v in zip(keyset[:i], values[:i])]
+        clauses.append(op(getattr(model, key), values[i]))
+        conditions.append(sqla_exp.and_(*clauses))
+    return sqla_exp.or_(*conditions)
+
+
 def _parse_attribute_name(model, name):
     """Parses a (probably) nested attribute name.
 
@@ -204,6 +401,8 @@ class SQLAVisitor(ast.NodeVisitor):
         self.sqla_query = []
         self.ops = []
         self.current_value = None
+        # (literal, value, condition) for each literal compared against
+        self.literals = []
 
     def visit_Module(self, node):
         """ Module handler, our entry point.
@@ -211,6 +410,7 @@ class SQLAVisitor(ast.NodeVisitor):
         self.sqla_query = []
         self.ops = []
         self.current_value = None
+        self.literals = []
 
         # perform the magic.
         self.generic_visit(node)
@@ -241,6 +441,7 @@ class SQLAVisitor(ast.NodeVisitor):
 
         operation = self.op_mapper[node.ops[0].__class__]
 
+        comparator = None
         if node.comparators:
             comparator = node.comparators[0]
             self.visit(comparator)
@@ -267,10 +468,16 @@ class SQLAVisitor(ast.NodeVisitor):
                 remote_column = list(mapper.primary_key)[0]
             left = remote_column
 
+        condition = operation(left, value)
+        if isinstance(comparator, (ast.Num, ast.Str)):
+            literal = comparator.n if isinstance(comparator, ast.Num) \
+                else comparator.s
+            self.literals.append((literal, value, condition))
+
         if self.ops:
-            self.ops[-1]['args'].append(operation(left, value))
+            self.ops[-1]['args'].append(condition)
         else:
-            self.sqla_query.append(operation(left, value))
+            self.sqla_query.append(condition)
 
     def visit_BoolOp(self, node):
         """ Boolean operator handler.
@@ -308,8 +515,4 @@ class SQLAVisitor(ast.NodeVisitor):
 
     def visit_Str(self, node):
         """ Strings """
-        try:
-            value = str_to_date(node.s)
-            self.current_value = value if value is not None else node.s
-        except ValueError:
-            self.current_value = node.s
+        self.current_value = _parse_str(node.s)
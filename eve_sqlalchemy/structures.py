@@ -9,7 +9,17 @@
 """
 from __future__ import unicode_literals
 
-from .utils import sqla_object_to_dict
+import datetime
+import decimal
+import json
+
+from eve.exceptions import ConfigException
+from eve.utils import config
+from sqlalchemy.sql.expression import bindparam
+
+from .instrumentation import add_rows, operation
+from .parser import parameterize
+from .utils import encode_cursor, row_to_dict, sqla_object_to_dict
 
 
 class SQLAResultCollection(object):
@@ -23,7 +33,23 @@ class SQLAResultCollection(object):
     :param sort: sorting requirements
     :param max_results: number of entries to be returned per page
     :param page: page requested
+    :param keyset: sort keys as a list of `(key, order)` tuples if keyset
+                   pagination is used
+    :param after: condition selecting the rows following the client's cursor
+                  when using keyset pagination
+    :param count_strategy: how to count the total number of results, one of
+                           `exact`, `lazy`, `cached`, `estimated` or `none`
+    :param count_cache: :class:`LRUCache` used by the `cached` strategy
+    :param count_cache_ttl: time to live of cached counts in seconds
+    :param bakery: :func:`sqlalchemy.ext.baked.bakery` used to cache the
+                   construction of the queries
+    :param cache_key: key identifying the shape of the query in the `bakery`
+    :param columns: keys of the columns if the query selects plain rows
+                    according to a :func:`~eve_sqlalchemy.utils.column_plan`
+                    instead of model instances
     """
+    count_strategies = ('exact', 'lazy', 'cached', 'estimated', 'none')
+
     def __init__(self, query, fields, **kwargs):
         self._query = query
         self._fields = fields
@@ -32,24 +58,282 @@ class SQLAResultCollection(object):
         self._max_results = kwargs.get('max_results')
         self._page = kwargs.get('page')
         self._resource = kwargs.get('resource')
+        self._keyset = kwargs.get('keyset')
+        self._after = kwargs.get('after')
+        self._count_strategy = kwargs.get('count_strategy') or 'exact'
+        self._count_cache = kwargs.get('count_cache')
+        self._count_cache_ttl = kwargs.get('count_cache_ttl')
+        if self._count_strategy not in self.count_strategies:
+            raise ConfigException(
+                'Unknown count strategy \'%s\'' % self._count_strategy)
+        self._bakery = kwargs.get('bakery')
+        self._cache_key = kwargs.get('cache_key')
+        self._columns = kwargs.get('columns')
+        self._last = None
+        self._has_more = False
+        self._count = None
+        self._count_params = {}
+        if self._bakery is not None:
+            self._bake_query()
+        else:
+            self._build_query()
+        if self._count_strategy == 'exact':
+            self._count = self._count_query.count()
+
+    def _build_query(self):
         if self._spec:
             self._query = self._query.filter(*self._spec)
         if self._sort:
             for (order_by, joins) in self._sort:
                 self._query = self._query.filter(*joins).order_by(order_by)
 
-        # save the count of items to an internal variables before applying the
-        # limit to the query as that screws the count returned by it
-        self._count = self._query.count()
+        # save the query for counting the items before applying the limit to
+        # the query as that screws the count returned by it
+        self._count_query = self._query.order_by(None)
+        if self._after is not None:
+            self._query = self._query.filter(self._after)
         if self._max_results:
-            self._query = self._query.limit(self._max_results)
+            # With keyset pagination we fetch one additional row to know if
+            # there is a next page.
+            self._query = self._query.limit(self._limit())
             if self._page:
                 self._query = self._query.offset((self._page - 1) *
                                                  self._max_results)
 
+    def _bake_query(self):
+        """Same as :meth:`_build_query`, but using a baked query, so the SQL
+        is only compiled once per `cache_key`. The key has to identify the
+        shape of `spec`, `sort` and `after`, as all their values are replaced
+        with bind parameters.
+        """
+        query = self._query
+        session = query.session
+        spec, params = parameterize(self._spec or [], '_s')
+        sort = self._sort
+
+        bq = self._bakery(lambda s: query.with_session(s), *self._cache_key)
+        if spec:
+            bq += lambda q: q.filter(*spec)
+        if sort:
+            def order(q):
+                for (order_by, joins) in sort:
+                    q = q.filter(*joins).order_by(order_by)
+                return q
+            bq += order
+
+        self._count_bq = bq.with_criteria(lambda q: q.order_by(None))
+        self._count_params = dict(params)
+        self._count_query = self._count_bq(session).params(**params)
+        if self._after is not None:
+            after, after_params = parameterize([self._after], '_a')
+            params.update(after_params)
+            bq += lambda q: q.filter(*after)
+        if self._max_results:
+            params['_limit'] = self._limit()
+            bq += lambda q: q.limit(bindparam('_limit'))
+            if self._page:
+                params['_offset'] = (self._page - 1) * self._max_results
+                bq += lambda q: q.offset(bindparam('_offset'))
+        self._query = bq(session).params(**params)
+
+    def _limit(self):
+        return self._max_results + 1 if self._keyset else self._max_results
+
+    def __iter__(self):
+        rows = 0
+        with operation(self._resource, 'find'):
+            try:
+                for n, i in enumerate(self._query):
+                    if self._keyset and self._max_results and \
+                       n == self._max_results:
+                        self._has_more = True
+                        break
+                    rows += 1
+                    self._last = i
+                    if self._columns:
+                        yield row_to_dict(i, self._columns)
+                    else:
+                        yield sqla_object_to_dict(i, self._fields)
+            finally:
+                add_rows(rows)
+
+    def stream(self, batch_size=1000):
+        """Yields the documents like iterating over the collection, but
+        fetches the rows in batches of `batch_size`, using a server-side
+        cursor if the database driver supports it. Memory usage therefore
+        does not grow with the number of rows.
+        """
+        query = self._query
+        if self._bakery is not None:
+            query = query.with_post_criteria(
+                lambda q: q.yield_per(batch_size))
+        else:
+            query = query.yield_per(batch_size)
+        rows = 0
+        with operation(self._resource, 'find'):
+            try:
+                for i in query:
+                    rows += 1
+                    if self._columns:
+                        yield row_to_dict(i, self._columns)
+                    else:
+                        yield sqla_object_to_dict(i, self._fields)
+            finally:
+                add_rows(rows)
+
+    def count(self, **kwargs):
+        if self._count is None and self._count_strategy != 'none':
+            if self._count_strategy == 'cached':
+                self._count = self._cached_count()
+            elif self._count_strategy == 'estimated':
+                self._count = self._estimated_count()
+            else:
+                self._count = self._count_query.count()
+        return self._count
+
+    def _cached_count(self):
+        if self._bakery is not None:
+            key = (self._resource, self._cache_key,
+                   json.dumps(self._count_params, sort_keys=True,
+                              default=repr))
+        else:
+            compiled = self._count_query.statement.compile()
+            key = (self._resource, compiled.string,
+                   json.dumps(compiled.params, sort_keys=True, default=repr))
+        count = self._count_cache.get(key)
+        if count is None:
+            count = self._count_query.count()
+            self._count_cache.set(key, count, self._count_cache_ttl)
+        return count
+
+    def _estimated_count(self):
+        """Returns the number of rows estimated by the query planner. This
+        is only supported for PostgreSQL, other databases fall back to an
+        exact count.
+        """
+        session = self._count_query.session
+        query = self._count_query
+        if self._bakery is not None:
+            query = self._count_bq.to_query(session)
+        statement = query.statement
+        bind = session.get_bind(clause=statement)
+        if bind.dialect.name != 'postgresql':
+            return self._count_query.count()
+        compiled = statement.compile(dialect=bind.dialect)
+        params = dict(compiled.params, **self._count_params)
+        plan = session.connection(clause=statement).execute(
+            'EXPLAIN (FORMAT JSON) ' + compiled.string, params).scalar()
+        if not isinstance(plan, list):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def extra(self, response):
+        """Adds the cursor for the next page to the response's meta data if
+        keyset pagination is used and there are more results, and removes the
+        total if the results are never counted.
+        """
+        if self._count_strategy == 'none':
+            _remove_total(response)
+        if self._has_more:
+            keys = [key for key, _ in self._keyset]
+            values = [getattr(self._last, key) for key in keys]
+            response.setdefault(config.META, {})[
+                config.SQL_QUERY_AFTER] = encode_cursor(keys, values)
+
+
+class CachedResultCollection(object):
+    """
+    Collection of documents materialized from a :class:`SQLAResultCollection`
+    along with its count and meta data, so it can be stored in the result
+    cache.
+
+    :param documents: list of documents
+    :param count: total number of results, `None` if it is not known
+    :param meta: meta data added to the response by the collection
+    """
+
+    def __init__(self, documents, count, meta):
+        self._documents = documents
+        self._count = count
+        self._meta = meta
+        self._count_source = None
+        self._on_count = None
+
+    @classmethod
+    def from_collection(cls, collection):
+        """Materializes `collection`. Its count is only included if the
+        count strategy has already computed it, see :meth:`count_from`."""
+        documents = list(collection)
+        response = {}
+        collection.extra(response)
+        result = cls(documents, collection._count, response.get(config.META))
+        result.count_from(collection)
+        return result
+
+    def count_from(self, collection, on_count=None):
+        """Counts the results using `collection` if the count is not known,
+        calling `on_count` with this collection once it has been counted."""
+        self._count_source = collection
+        self._on_count = on_count
+
     def __iter__(self):
-        for i in self._query:
-            yield sqla_object_to_dict(i, self._fields)
+        return iter(self._documents)
 
     def count(self, **kwargs):
+        if self._count is None and self._count_source is not None:
+            self._count = self._count_source.count(**kwargs)
+            if self._count is not None and self._on_count is not None:
+                self._on_count(self)
         return self._count
+
+    def extra(self, response):
+        if self._count is None:
+            _remove_total(response)
+        if self._meta:
+            response.setdefault(config.META, {}).update(self._meta)
+
+    def dumps(self):
+        """Returns the collection serialized as JSON, or `None` if a document
+        contains values which can't be restored from JSON."""
+        try:
+            return json.dumps([self._documents, self._count, self._meta],
+                              default=_encode_value, separators=(',', ':'))
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def loads(cls, data):
+        """Restores a collection serialized by :meth:`dumps`."""
+        documents, count, meta = json.loads(data, object_hook=_decode_value)
+        return cls(documents, count, meta)
+
+
+def _remove_total(response):
+    response.get(config.META, {}).pop('total', None)
+
+
+_datetime_format = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime) and value.tzinfo is None:
+        return {'$datetime': value.strftime(_datetime_format)}
+    if isinstance(value, datetime.date) and \
+       not isinstance(value, datetime.datetime):
+        return {'$date': value.strftime('%Y-%m-%d')}
+    if isinstance(value, decimal.Decimal):
+        return {'$decimal': str(value)}
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def _decode_value(value):
+    if len(value) == 1:
+        if '$datetime' in value:
+            return datetime.datetime.strptime(value['$datetime'],
+                                              _datetime_format)
+        if '$date' in value:
+            return datetime.datetime.strptime(value['$date'],
+                                              '%Y-%m-%d').date()
+        if '$decimal' in value:
+            return decimal.Decimal(value['$decimal'])
+    return value
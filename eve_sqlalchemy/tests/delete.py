@@ -7,6 +7,7 @@ from eve.tests.methods import delete as eve_delete_tests
 from eve.tests.utils import DummyEvent
 
 from eve_sqlalchemy.tests import TestBase
+from eve_sqlalchemy.tests.test_sql_tables import Contacts
 
 
 class TestDelete(eve_delete_tests.TestDelete, TestBase):
@@ -89,6 +90,18 @@ class TestDelete(eve_delete_tests.TestDelete, TestBase):
                                        headers=headers)
         self.assert204(status)
 
+    def test_is_empty_applies_datasource_filter(self):
+        with self.app.app_context():
+            self.assertTrue(self.app.data.is_empty('empty'))
+            self.assertFalse(self.app.data.is_empty('contacts'))
+            self.assertFalse(self.app.data.is_empty('users'))
+            # `users` only includes contacts with a username.
+            session = self.app.data.driver.session
+            session.query(Contacts).update({'username': ''})
+            session.commit()
+            self.assertFalse(self.app.data.is_empty('contacts'))
+            self.assertTrue(self.app.data.is_empty('users'))
+
 
 class TestDeleteEvents(eve_delete_tests.TestDeleteEvents, TestBase):
 
@@ -7,7 +7,9 @@ import pytest
 import simplejson as json
 from eve.tests.methods import get as eve_get_tests
 
+from eve_sqlalchemy.parser import filter_cache
 from eve_sqlalchemy.tests import TestBase
+from eve_sqlalchemy.tests.test_sql_tables import Contacts
 
 
 class TestGet(eve_get_tests.TestGet, TestBase):
@@ -435,6 +437,20 @@ class TestGetItem(eve_get_tests.TestGetItem, TestBase):
         response, status = self.get('products', item=sku)
         self.assertItemResponse(response, status, 'products')
 
+    def test_getitem_with_datasource_filter_twice(self):
+        # Cached filters must not accumulate the lookups of earlier requests.
+        with self.app.app_context():
+            ids = [c._id for c in self.app.data.driver.session.query(Contacts)
+                   .filter(Contacts.username != '')]
+        self.assertEqual(len(ids), 2)
+        filter_cache.clear()
+        for id_ in ids:
+            response, status = self.get('users', item=id_)
+            self.assert200(status)
+            self.assertEqual(response['_id'], id_)
+        response, status = self.get('users')
+        self.assertEqual(len(response['_items']), 2)
+
 
 class TestHead(eve_get_tests.TestHead, TestBase):
     pass
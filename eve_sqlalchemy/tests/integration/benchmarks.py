@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from eve_sqlalchemy import benchmarks
+
+
+class TestBenchmarks(TestCase):
+
+    def test_all_scenarios_run_without_errors(self):
+        results = benchmarks.run(people=30, fan_out=2, iterations=3,
+                                 warmup=1)
+        self.assertEqual(list(results['scenarios']),
+                         list(benchmarks.scenarios))
+        for name, result in results['scenarios'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertGreater(result['statements']['mean'], 0, name)
+            self.assertLessEqual(result['latency_ms']['p50'],
+                                 result['latency_ms']['max'])
+
+    def test_main_writes_json_for_a_file_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'results.json')
+        benchmarks.main(['--database', os.path.join(directory, 'db.sqlite'),
+                         '--people', '10', '--iterations', '2',
+                         '--scenario', 'item', '--output', output])
+        with open(output) as f:
+            results = json.load(f)
+        self.assertEqual(list(results['scenarios']), ['item'])
+        self.assertEqual(results['scenarios']['item']['iterations'], 2)
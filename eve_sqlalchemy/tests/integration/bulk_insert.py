@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from sqlalchemy import Column, DateTime, Integer, String, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.declarative import declarative_base
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Node(BaseModel):
+    __tablename__ = 'node'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'RESOURCE_METHODS': ['GET', 'POST', 'DELETE'],
+    'ITEM_METHODS': ['GET', 'PATCH', 'DELETE', 'PUT'],
+    'DOMAIN': DomainConfig({
+        'nodes': ResourceConfig(Node),
+    }).render()
+}
+
+
+class TestBulkInsert(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestBulkInsert, self).setUp(SETTINGS, url_converters, Base)
+
+    def bulk_insert(self):
+        pass
+
+    def test_generated_ids_are_returned_in_order(self):
+        documents = [{'name': 'node%d' % k} for k in range(50)]
+        with self.app.test_request_context():
+            ids = self.app.data.insert('nodes', documents)
+        self.assertEqual(ids, [d['id'] for d in documents])
+        self.assertEqual(len(set(ids)), 50)
+        response, status = self.get('nodes', '?where={"name": "node7"}')
+        self.assertEqual(response['_items'][0]['id'], ids[7])
+
+    def test_documents_are_inserted_in_a_single_transaction(self):
+        with self.app.test_request_context():
+            self.assertRaises(IntegrityError, self.app.data.insert, 'nodes',
+                              [{'id': 1}, {'id': 2}, {'id': 1}])
+            self.app.data.driver.session.rollback()
+        response, status = self.get('nodes')
+        self.assert200(status)
+        self.assertEqual(response['_items'], [])
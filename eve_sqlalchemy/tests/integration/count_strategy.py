@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from sqlalchemy import Column, DateTime, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Node(BaseModel):
+    __tablename__ = 'node'
+    id = Column(Integer, primary_key=True)
+
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'RESOURCE_METHODS': ['GET', 'POST', 'DELETE'],
+    'ITEM_METHODS': ['GET', 'PATCH', 'DELETE', 'PUT'],
+    'SQL_COUNT_STRATEGY': 'cached',
+    'DOMAIN': DomainConfig({
+        'nodes': ResourceConfig(Node),
+        'uncounted_nodes': ResourceConfig(Node),
+    }).render()
+}
+SETTINGS['DOMAIN']['uncounted_nodes']['sql_count_strategy'] = 'none'
+
+
+class TestCountStrategy(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestCountStrategy, self).setUp(SETTINGS, url_converters, Base)
+
+    def bulk_insert(self):
+        self.app.data.insert('nodes', [{'id': k} for k in range(1, 5)])
+
+    def test_cached_count(self):
+        response, status = self.get('nodes')
+        self.assert200(status)
+        self.assertEqual(response['_meta']['total'], 4)
+        self.app.data.insert('nodes', [{'id': 5}])
+        response, status = self.get('nodes')
+        self.assertEqual(len(response['_items']), 5)
+        self.assertEqual(response['_meta']['total'], 4)
+
+    def test_count_can_be_skipped(self):
+        response, status = self.get('uncounted_nodes')
+        self.assert200(status)
+        self.assertEqual(len(response['_items']), 4)
+        self.assertNotIn('total', response['_meta'])
+        r = self.test_client.get('/uncounted_nodes')
+        self.assertNotIn('X-Total-Count', r.headers)
+        r = self.test_client.get('/nodes')
+        self.assertEqual(r.headers['X-Total-Count'], '4')
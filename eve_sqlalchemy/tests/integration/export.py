@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+from sqlalchemy import Column, DateTime, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.export import export
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Node(BaseModel):
+    __tablename__ = 'node'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'SQL_EXPORT_BATCH_SIZE': 7,
+    'PAGINATION_DEFAULT': 10,
+    'DOMAIN': DomainConfig({
+        'nodes': ResourceConfig(Node),
+    }).render()
+}
+
+
+class TestExport(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestExport, self).setUp(SETTINGS, url_converters, Base)
+        self.app.add_url_rule('/export/<resource>', view_func=export)
+
+    def bulk_insert(self):
+        self.app.data.insert('nodes', [
+            {'id': k, 'name': 'node, "%d"' % k} for k in range(1, 51)])
+
+    def test_export_ndjson_ignores_pagination(self):
+        r = self.test_client.get('/export/nodes?where=id>5'
+                                 '&sort=-id&projection={"name": 1}')
+        self.assert200(r.status_code)
+        self.assertEqual(r.mimetype, 'application/x-ndjson')
+        documents = [json.loads(line)
+                     for line in r.get_data(as_text=True).splitlines()]
+        self.assertEqual([d['id'] for d in documents],
+                         list(range(50, 5, -1)))
+        self.assertEqual(documents[0]['name'], 'node, "50"')
+
+    def test_export_csv(self):
+        r = self.test_client.get('/export/nodes?format=csv&sort=id'
+                                 '&projection={"name": 1}')
+        self.assert200(r.status_code)
+        lines = r.get_data(as_text=True).split('\r\n')
+        # The etag is only rendered if set, which `bulk_insert` does not.
+        self.assertEqual(lines[0], '_created,_updated,id,name')
+        self.assertTrue(lines[1].endswith(',1,"node, ""1"""'))
+        self.assertEqual(len(lines), 52)
+
+    def test_export_unknown_resource_or_format(self):
+        r = self.test_client.get('/export/unknown')
+        self.assert404(r.status_code)
+        r = self.test_client.get('/export/nodes?format=xml')
+        self.assert400(r.status_code)
+
+    def test_export_rejects_embedded(self):
+        r = self.test_client.get('/export/nodes?embedded={"parent": 1}')
+        self.assert400(r.status_code)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from sqlalchemy import Column, DateTime, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Node(BaseModel):
+    __tablename__ = 'node'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'RESOURCE_METHODS': ['GET', 'POST', 'DELETE'],
+    'ITEM_METHODS': ['GET', 'PATCH', 'DELETE', 'PUT'],
+    'SQL_IN_CHUNK_SIZE': 2,
+    'DOMAIN': DomainConfig({
+        'nodes': ResourceConfig(Node),
+        'filtered_nodes': ResourceConfig(Node),
+    }).render()
+}
+SETTINGS['DOMAIN']['filtered_nodes']['datasource']['filter'] = 'id > 2'
+
+
+class TestFindListOfIds(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestFindListOfIds, self).setUp(SETTINGS, url_converters, Base)
+
+    def bulk_insert(self):
+        self.app.data.insert('nodes', [{'id': k, 'name': 'node%d' % k}
+                                       for k in range(1, 6)])
+
+    def test_documents_are_returned_in_order(self):
+        with self.app.test_request_context():
+            documents = self.app.data.find_list_of_ids(
+                'nodes', [4, '2', 5, 42, 1, 4])
+        self.assertEqual([d['id'] for d in documents], [4, 2, 5, 1])
+        self.assertEqual(documents[0]['name'], 'node4')
+
+    def test_resource_filter_and_projection(self):
+        with self.app.test_request_context():
+            documents = self.app.data.find_list_of_ids(
+                'filtered_nodes', [1, 2, 3], {'name': 0})
+        self.assertEqual([d['id'] for d in documents], [3])
+        self.assertNotIn('name', documents[0])
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from eve import Eve
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+from eve_sqlalchemy import SQL
+from eve_sqlalchemy.advisor import advise, format_report
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Author(BaseModel):
+    __tablename__ = 'author'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32), unique=True)
+
+
+class Book(BaseModel):
+    __tablename__ = 'book'
+    id = Column(Integer, primary_key=True)
+    title = Column(String(32))
+    year = Column(Integer)
+    author_id = Column(Integer, ForeignKey('author.id'))
+    author = relationship(Author)
+
+
+DOMAIN = DomainConfig({
+    'authors': ResourceConfig(Author),
+    'books': ResourceConfig(Book),
+}).render()
+DOMAIN['authors']['allowed_filters'] = ['name']
+DOMAIN['books']['default_sort'] = [('year', -1)]
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'SQL_RECORD_FILTER_SHAPES': True,
+    'DOMAIN': DOMAIN,
+}
+
+
+class TestIndexAdvisor(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestIndexAdvisor, self).setUp(SETTINGS, url_converters, Base)
+
+    def bulk_insert(self):
+        self.app.data.insert('authors', [{'id': 1, 'name': 'a'}])
+        self.app.data.insert('books', [
+            {'id': k, 'title': 't%d' % k, 'author': 1} for k in range(5)])
+
+    def suggested(self):
+        return dict(((s.table, s.columns), s)
+                    for s in advise(self.app))
+
+    def test_static_suggestions(self):
+        suggestions = self.suggested()
+        self.assertIn('relationship', suggestions[('book', ('author_id',))]
+                      .reasons)
+        self.assertIn(('book', ('year',)), suggestions)
+        # covered by the unique constraint
+        self.assertNotIn(('author', ('name',)), suggestions)
+
+    def test_observed_queries(self):
+        for _ in range(3):
+            self.get('books', '?where={"title": "t1"}&sort=year')
+        suggestions = self.suggested()
+        suggestion = suggestions[('book', ('title', 'year'))]
+        self.assertEqual(suggestion.reasons, ['observed query'])
+        self.assertEqual(suggestion.frequency, 3)
+        self.assertEqual(suggestion.rows, 5)
+        self.assertEqual(suggestion.ddl, 'CREATE INDEX ix_book_title_year '
+                                         'ON book (title, year)')
+        self.assertIn(suggestion.ddl + ';',
+                      format_report(advise(self.app)).splitlines())
+
+    def test_existing_indexes_are_not_suggested(self):
+        with self.app.app_context():
+            self.app.data.driver.engine.execute(
+                'CREATE INDEX ix_book_author ON book (author_id)')
+        self.assertNotIn(('book', ('author_id',)), self.suggested())
+
+    def test_recording_is_per_app(self):
+        other = Eve(settings=dict(SETTINGS, SQL_RECORD_FILTER_SHAPES=False),
+                    data=SQL)
+        self.get('books', '?where={"title": "t1"}')
+        self.assertEqual(len(self.app.data.filter_shapes.items()), 1)
+        self.assertEqual(other.data.filter_shapes.items(), [])
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from eve_sqlalchemy.examples.many_to_one import settings
+from eve_sqlalchemy.examples.many_to_one.domain import Base, Child
+from eve_sqlalchemy.tests import TestMinimal
+
+collected = []
+
+SETTINGS = dict(vars(settings), SQL_INSTRUMENTATION=True,
+                SQL_INSTRUMENTATION_HEADERS=True,
+                SQL_INSTRUMENTATION_SINK=collected.append)
+
+
+class TestInstrumentation(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestInstrumentation, self).setUp(SETTINGS, url_converters, Base)
+        del collected[:]
+
+    def bulk_insert(self):
+        self.app.data.insert('children', [{'id': k} for k in range(1, 5)])
+        self.app.data.insert('parents', [
+            {'id': 1, 'child': 1},
+            {'id': 2, 'child': 1},
+            {'id': 3}])
+
+    def test_collection_stats(self):
+        r = self.test_client.get('/parents')
+        self.assert200(r.status_code)
+        self.assertEqual(r.headers['X-SQL-Rows'], '3')
+        # the parents and their eagerly loaded child
+        self.assertGreaterEqual(int(r.headers['X-SQL-Instances']), 3)
+        self.assertGreaterEqual(int(r.headers['X-SQL-Statements']), 2)
+        self.assertGreaterEqual(float(r.headers['X-SQL-Time']), 0)
+
+        self.assertEqual(len(collected), 1)
+        stats = collected[0].as_dict()
+        self.assertEqual(stats['rows'], 3)
+        operations = [(o['resource'], o['operation'])
+                      for o in stats['operations']]
+        self.assertEqual(operations, [('parents', 'find')])
+        self.assertEqual(stats['operations'][0]['statements'],
+                         stats['statements'])
+
+    def test_item_stats(self):
+        r = self.test_client.get('/children/2')
+        self.assert200(r.status_code)
+        self.assertEqual(r.headers['X-SQL-Rows'], '1')
+        operations = collected[0].operations
+        self.assertIn(('children', 'find_one'), operations)
+
+
+class TestSlowQueryLog(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestSlowQueryLog, self).setUp(
+            dict(vars(settings), SQL_SLOW_QUERY_THRESHOLD=0), url_converters,
+            Base)
+        self.messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: self.messages.append(
+            record.getMessage())
+        self.app.logger.addHandler(handler)
+        self.addCleanup(self.app.logger.removeHandler, handler)
+
+    def bulk_insert(self):
+        self.app.data.insert('children', [{'id': k} for k in range(1, 5)])
+
+    def test_slow_queries_are_logged_with_plan(self):
+        r = self.test_client.get('/children?where={"id": 2}')
+        self.assert200(r.status_code)
+        messages = [m for m in self.messages if 'in find of children' in m]
+        self.assertTrue(messages)
+        self.assertIn('[where={"id": 2}]', messages[-1])
+        self.assertIn('Query plan:', messages[-1])
+
+    def test_explain_keeps_the_transaction(self):
+        # In-memory SQLite shares a single connection, which must not be
+        # rolled back by capturing a plan.
+        with self.app.test_request_context():
+            self.app.preprocess_request()
+            session = self.app.data.driver.session
+            session.add(Child(id=10))
+            session.flush()
+            ids = [c.id for c in session.query(Child).order_by(Child.id)]
+            self.assertEqual(ids, [1, 2, 3, 4, 10])
+            session.rollback()
+        self.assertTrue(any('Query plan:' in m for m in self.messages))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from sqlalchemy import Column, DateTime, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Node(BaseModel):
+    __tablename__ = 'node'
+    id = Column(Integer, primary_key=True)
+    rank = Column(Integer)
+    name = Column(String(32))
+
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'RESOURCE_METHODS': ['GET', 'POST', 'DELETE'],
+    'ITEM_METHODS': ['GET', 'PATCH', 'DELETE', 'PUT'],
+    'PAGINATION_DEFAULT': 3,
+    'DOMAIN': DomainConfig({
+        'nodes': ResourceConfig(Node),
+    }).render()
+}
+SETTINGS['DOMAIN']['nodes']['sql_pagination_mode'] = 'keyset'
+
+
+class TestKeysetPagination(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestKeysetPagination, self).setUp(SETTINGS, url_converters,
+                                                Base)
+
+    def bulk_insert(self):
+        self.app.data.insert('nodes', [
+            {'id': k, 'rank': k % 3, 'name': 'node%d' % k}
+            for k in range(1, 9)])
+
+    def test_pages_by_id_without_sort(self):
+        self.assertEqual(self._get_all_pages(''),
+                         [[1, 2, 3], [4, 5, 6], [7, 8]])
+
+    def test_pages_with_descending_sort_and_ties(self):
+        self.assertEqual(self._get_all_pages('sort=-rank'),
+                         [[2, 5, 8], [1, 4, 7], [3, 6]])
+
+    def test_pages_with_filter(self):
+        self.assertEqual(self._get_all_pages('where={"rank": 1}&sort=-id'),
+                         [[7, 4, 1]])
+
+    def test_total_is_independent_of_cursor(self):
+        response, status = self.get('nodes')
+        after = response['_meta']['after']
+        response, status = self.get('nodes', '?after=%s' % after)
+        self.assert200(status)
+        self.assertEqual(response['_meta']['total'], 8)
+
+    def test_cursor_must_match_sort(self):
+        response, status = self.get('nodes', '?sort=rank')
+        after = response['_meta']['after']
+        response, status = self.get('nodes', '?sort=name&after=%s' % after)
+        self.assert400(status)
+
+    def test_invalid_cursor(self):
+        response, status = self.get('nodes', '?after=invalid')
+        self.assert400(status)
+
+    def _get_all_pages(self, query):
+        pages = []
+        after = None
+        while True:
+            args = query + ('&after=%s' % after if after else '')
+            response, status = self.get('nodes', '?' + args)
+            self.assert200(status)
+            pages.append([i['id'] for i in response['_items']])
+            after = response['_meta'].get('after')
+            if not after or len(pages) > 5:
+                return pages
+
+    def test_if_match_changes_the_baked_query(self):
+        args = '?sort=rank&projection={"name": 1}'
+        self.app.config['IF_MATCH'] = False
+        response, status = self.get('nodes', args)
+        self.assert200(status)
+        self.assertNotIn('_etag', response['_items'][0])
+        self.app.config['IF_MATCH'] = True
+        response, status = self.get('nodes', args)
+        self.assert200(status)
+        for item in response['_items']:
+            self.assertEqual(len(item['_etag']), 40)
+
+    def test_if_match_changes_the_baked_lookup(self):
+        self.app.config['IF_MATCH'] = False
+        response, status = self.get('nodes', item=1)
+        self.assert200(status)
+        self.assertNotIn('_etag', response)
+        self.app.config['IF_MATCH'] = True
+        response, status = self.get('nodes', item=1)
+        self.assert200(status)
+        self.assertEqual(response['name'], 'node1')
+        self.assertEqual(len(response['_etag']), 40)
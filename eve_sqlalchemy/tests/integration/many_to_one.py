@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from sqlalchemy import event
+
 from eve_sqlalchemy.examples.many_to_one import settings
 from eve_sqlalchemy.examples.many_to_one.domain import Base
 from eve_sqlalchemy.tests import TestMinimal
@@ -31,3 +33,42 @@ class TestManyToOne(TestMinimal):
         self.assert200(status)
         parents = response['_items']
         self.assertEqual([p['id'] for p in parents], [1, 2])
+
+    def test_embedded_relations_are_loaded_eagerly(self):
+        data_relation = \
+            self.domain['parents']['schema']['child']['data_relation']
+        data_relation['embeddable'] = True
+        self.addCleanup(data_relation.pop, 'embeddable')
+        statements = []
+
+        def count_statement(*args, **kwargs):
+            statements.append(args[2])
+
+        engine = self.connection.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            response, status = self.get('parents',
+                                        '?embedded={"child": 1}')
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+        self.assert200(status)
+        self.assertEqual(response['_items'][0]['child']['id'], 1)
+        # count, parents joined with children and the parents of child 1
+        self.assertLessEqual(len(statements), 3)
+
+    def test_delete_parents(self):
+        with self.app.test_request_context():
+            self.app.data.remove('parents', {})
+        response, _ = self.get('parents')
+        self.assertEqual(response['_items'], [])
+        response, _ = self.get('children')
+        self.assertEqual(len(response['_items']), 4)
+
+    def test_delete_children_nulls_out_references(self):
+        with self.app.test_request_context():
+            self.app.data.remove('children', {})
+        response, _ = self.get('children')
+        self.assertEqual(response['_items'], [])
+        response, _ = self.get('parents')
+        self.assertEqual([p.get('child') for p in response['_items']],
+                         [None, None, None])
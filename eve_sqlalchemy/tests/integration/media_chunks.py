@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+from io import BytesIO
+
+from sqlalchemy import Column, DateTime, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+from werkzeug.datastructures import FileStorage
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.examples.simple import settings
+from eve_sqlalchemy.examples.simple.tables import Base
+from eve_sqlalchemy.media import (
+    SQLChunkedMediaStorage, SQLDeduplicatingMediaStorage, media_chunks,
+    media_metadata,
+)
+from eve_sqlalchemy.tests import TestMinimal
+
+SETTINGS = dict(vars(settings), SQL_MEDIA_CHUNK_SIZE=10)
+
+
+class SlowStream(BytesIO):
+    """Returns at most 3 bytes per read, like a network stream might."""
+
+    def read(self, size=-1):
+        return super(SlowStream, self).read(3 if size < 0 else min(size, 3))
+
+
+class TestChunkedMediaStorage(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestChunkedMediaStorage, self).setUp(SETTINGS, url_converters,
+                                                   Base)
+        media_metadata.create_all(self.connection.engine)
+        self.storage = SQLChunkedMediaStorage(self.app)
+        self.content = ''.join('%02d' % k for k in range(50)).encode()
+
+    def tearDown(self):
+        media_metadata.drop_all(self.connection.engine)
+        super(TestChunkedMediaStorage, self).tearDown()
+
+    def bulk_insert(self):
+        pass
+
+    def put(self, stream):
+        with self.app.app_context():
+            file_id = self.storage.put(FileStorage(
+                stream, filename='a.txt', content_type='text/plain'))
+            self.app.data.driver.session.commit()
+        return file_id
+
+    def test_put_and_get(self):
+        file_id = self.put(SlowStream(self.content))
+        with self.app.app_context():
+            self.assertTrue(self.storage.exists(file_id))
+            media = self.storage.get(file_id)
+            self.assertEqual(media.length, 100)
+            self.assertEqual(media.filename, 'a.txt')
+            self.assertEqual(media.content_type, 'text/plain')
+            self.assertEqual(media.md5, hashlib.md5(self.content).hexdigest())
+            self.assertEqual(media.read(), self.content)
+            media.seek(0)
+            self.assertEqual([len(c) for c in media], [10] * 10)
+
+    def test_read_range(self):
+        file_id = self.put(BytesIO(self.content))
+        with self.app.app_context():
+            media = self.storage.get(file_id)
+            media.seek(15)
+            self.assertEqual(media.read(20), self.content[15:35])
+            self.assertEqual(media.tell(), 35)
+            media.seek(-5, 2)
+            self.assertEqual(media.read(100), self.content[-5:])
+            self.assertEqual(media.read(), b'')
+
+    def test_delete(self):
+        file_id = self.put(BytesIO(self.content))
+        with self.app.app_context():
+            self.storage.delete(file_id)
+            self.assertFalse(self.storage.exists(file_id))
+            self.assertIsNone(self.storage.get(file_id))
+
+
+class TestDeduplicatingMediaStorage(TestChunkedMediaStorage):
+
+    def setUp(self, url_converters=None):
+        super(TestDeduplicatingMediaStorage, self).setUp(url_converters)
+        self.storage = SQLDeduplicatingMediaStorage(self.app)
+
+    def count_chunks(self):
+        with self.app.app_context():
+            return len(self.app.data.driver.session.execute(
+                media_chunks.select()).fetchall())
+
+    def test_identical_files_are_stored_once(self):
+        first = self.put(BytesIO(self.content))
+        second = self.put(SlowStream(self.content))
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.count_chunks(), 10)
+        with self.app.app_context():
+            self.assertEqual(self.storage.get(second).read(), self.content)
+
+    def test_references_keep_their_metadata(self):
+        first = self.put(BytesIO(self.content))
+        with self.app.app_context():
+            second = self.storage.put(FileStorage(
+                BytesIO(self.content), filename='b.csv',
+                content_type='text/csv'))
+            self.app.data.driver.session.commit()
+            media = self.storage.get(first)
+            self.assertEqual((media.filename, media.content_type),
+                             ('a.txt', 'text/plain'))
+            media = self.storage.get(second)
+            self.assertEqual((media.filename, media.content_type),
+                             ('b.csv', 'text/csv'))
+            self.assertEqual(media.read(), self.content)
+        self.assertEqual(self.count_chunks(), 10)
+
+    def test_delete_removes_unreferenced_files(self):
+        first = self.put(BytesIO(self.content))
+        second = self.put(BytesIO(self.content))
+        with self.app.app_context():
+            self.storage.delete(first)
+            self.assertFalse(self.storage.exists(first))
+            self.assertTrue(self.storage.exists(second))
+            self.app.data.driver.session.commit()
+        self.assertEqual(self.count_chunks(), 10)
+        with self.app.app_context():
+            self.storage.delete(second)
+            self.assertFalse(self.storage.exists(second))
+            self.app.data.driver.session.commit()
+        self.assertEqual(self.count_chunks(), 0)
+
+
+MediaBase = declarative_base()
+
+
+class Attachment(MediaBase):
+    __tablename__ = 'attachment'
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+    id = Column(Integer, primary_key=True)
+    file = Column(String(64))
+
+
+MEDIA_DOMAIN = DomainConfig({
+    'attachments': ResourceConfig(Attachment),
+}).render()
+MEDIA_DOMAIN['attachments']['schema']['file'] = {'type': 'media'}
+
+MEDIA_SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'RESOURCE_METHODS': ['GET', 'POST'],
+    'RETURN_MEDIA_AS_BASE64_STRING': False,
+    'RETURN_MEDIA_AS_URL': True,
+    'MEDIA_URL': 'regex("[a-f0-9]{32,64}")',
+    'SQL_MEDIA_CHUNK_SIZE': 10,
+    'DOMAIN': MEDIA_DOMAIN,
+}
+
+
+class TestChunkedMediaEndpoint(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestChunkedMediaEndpoint, self).setUp(
+            MEDIA_SETTINGS, url_converters, MediaBase)
+        media_metadata.create_all(self.connection.engine)
+        self.app.media = SQLChunkedMediaStorage(self.app)
+        self.content = ''.join('%02d' % k for k in range(50)).encode()
+
+    def tearDown(self):
+        media_metadata.drop_all(self.connection.engine)
+        super(TestChunkedMediaEndpoint, self).tearDown()
+
+    def bulk_insert(self):
+        pass
+
+    def upload(self, content):
+        r = self.test_client.post('/attachments', data={
+            'id': '1', 'file': (BytesIO(content), 'a.txt')})
+        self.assert201(r.status_code)
+        response, status = self.get('attachments', item=1)
+        self.assert200(status)
+        return response['file']
+
+    def test_download(self):
+        url = self.upload(self.content)
+        r = self.test_client.get(url)
+        self.assert200(r.status_code)
+        self.assertEqual(r.get_data(), self.content)
+        self.assertEqual(r.headers['Content-Length'], '100')
+        # The chunks are streamed after the request's session was removed,
+        # which must not leave a new session behind.
+        self.assertFalse(self.app.data.driver.session.registry.has())
+
+    def test_download_small_file(self):
+        url = self.upload(b'small')
+        r = self.test_client.get(url)
+        self.assert200(r.status_code)
+        self.assertEqual(r.get_data(), b'small')
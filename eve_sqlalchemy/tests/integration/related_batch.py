@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Integer, String, event, func,
+)
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Parent(BaseModel):
+    __tablename__ = 'parent'
+    id = Column(Integer, primary_key=True)
+
+
+class Child(BaseModel):
+    __tablename__ = 'child'
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, ForeignKey('parent.id'))
+    parent = relationship(Parent)
+
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'RESOURCE_METHODS': ['GET', 'POST', 'DELETE'],
+    'ITEM_METHODS': ['GET', 'PATCH', 'DELETE', 'PUT'],
+    'DOMAIN': DomainConfig({
+        'parents': ResourceConfig(Parent),
+        'children': ResourceConfig(Child),
+    }).render()
+}
+
+
+class TestRelatedBatch(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestRelatedBatch, self).setUp(SETTINGS, url_converters, Base)
+
+    def bulk_insert(self):
+        self.app.data.insert('parents', [{'id': k} for k in range(1, 21)])
+
+    def test_related_values_are_checked_in_batches(self):
+        statements = []
+
+        def count_statement(*args, **kwargs):
+            statements.append(args[2])
+
+        engine = self.connection.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            response, status = self.post('/children', data=[
+                {'parent': k % 20 + 1} for k in range(100)])
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+        self.assert201(status)
+        selects = [s for s in statements if s.lstrip().startswith('SELECT')
+                   and 'parent' in s]
+        self.assertEqual(len(selects), 1)
+
+    def test_missing_related_values(self):
+        response, status = self.post('/children', data=[
+            {'parent': 1}, {'parent': 42}, {'parent': 2}])
+        self.assert422(status)
+        self.assertEqual([item['_status'] for item in response['_items']],
+                         ['OK', 'ERR', 'OK'])
+        self.assertIn('parent', response['_items'][1]['_issues'])
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from eve_sqlalchemy.examples.many_to_one import settings
+from eve_sqlalchemy.examples.many_to_one.domain import Base
+from eve_sqlalchemy.structures import CachedResultCollection
+from eve_sqlalchemy.tests import TestMinimal
+
+SETTINGS = dict(vars(settings), SQL_RESULT_CACHE=True)
+
+
+class TestResultCache(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestResultCache, self).setUp(SETTINGS, url_converters, Base)
+
+    def bulk_insert(self):
+        self.app.data.insert('children', [{'id': k} for k in range(1, 5)])
+        self.app.data.insert('parents', [
+            {'id': 1, 'child': 1},
+            {'id': 2, 'child': 1},
+            {'id': 3}])
+
+    def count_selects(self, *args):
+        statements = []
+
+        def count_statement(*args, **kwargs):
+            statements.append(args[2])
+
+        engine = self.connection.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            response, status = self.get(*args)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+        self.assert200(status)
+        self.statements = statements
+        return response, len([s for s in statements
+                              if s.lstrip().startswith('SELECT')])
+
+    def test_collections_are_served_from_the_cache(self):
+        first, selects = self.count_selects('parents')
+        self.assertGreater(selects, 0)
+        second, selects = self.count_selects('parents')
+        self.assertEqual(selects, 0)
+        self.assertEqual(second['_items'], first['_items'])
+        self.assertEqual(second['_meta'], first['_meta'])
+        _, selects = self.count_selects('parents', '?where={"child": 1}')
+        self.assertGreater(selects, 0)
+
+        info = self.app.data.result_cache_info()
+        self.assertEqual((info['hits'], info['misses']), (1, 2))
+        self.assertAlmostEqual(info['hit_ratio'], 1 / 3.0)
+        self.assertGreater(info['backend']['bytes'], 0)
+
+    def test_writes_invalidate_the_resource(self):
+        self.get('parents')
+        with self.app.test_request_context():
+            self.app.data.insert('parents', [{'id': 4}])
+        response, selects = self.count_selects('parents')
+        self.assertGreater(selects, 0)
+        self.assertEqual(len(response['_items']), 4)
+
+    def test_writes_invalidate_related_resources(self):
+        self.get('parents')
+        with self.app.test_request_context():
+            self.app.data.remove('children', {})
+        response, _ = self.count_selects('parents')
+        self.assertEqual([p.get('child') for p in response['_items']],
+                         [None, None, None])
+
+    def test_count_strategy_none_does_not_count(self):
+        self.app.config['SQL_COUNT_STRATEGY'] = 'none'
+        _, selects = self.count_selects('parents')
+        self.assertEqual(selects, 1)
+        self.assertFalse(any('count(' in s for s in self.statements))
+        _, selects = self.count_selects('parents')
+        self.assertEqual(selects, 0)
+
+    def test_lazy_counts_are_added_to_the_cache(self):
+        self.app.config['SQL_COUNT_STRATEGY'] = 'lazy'
+        first, selects = self.count_selects('parents')
+        self.assertEqual(first['_meta']['total'], 3)
+        second, selects = self.count_selects('parents')
+        self.assertEqual(selects, 0)
+        self.assertEqual(second['_meta']['total'], 3)
+
+    def test_serialization(self):
+        documents = [{'id': 1, 'at': datetime(2017, 1, 2, 3, 4, 5, 6),
+                      'day': datetime(2017, 1, 2).date(),
+                      'price': Decimal('1.10'), 'tags': ['a']}]
+        data = CachedResultCollection(documents, 1, {'after': 'x'}).dumps()
+        result = CachedResultCollection.loads(data)
+        self.assertEqual(list(result), documents)
+        self.assertEqual(result.count(), 1)
+        self.assertIsNone(
+            CachedResultCollection([{'data': object()}], 1, None).dumps())
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from sqlalchemy import Column, DateTime, Integer, String, event, func
+from sqlalchemy.ext.declarative import declarative_base
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Node(BaseModel):
+    __tablename__ = 'node'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32), unique=True)
+
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'RESOURCE_METHODS': ['GET', 'POST', 'DELETE'],
+    'ITEM_METHODS': ['GET', 'PATCH', 'DELETE', 'PUT'],
+    'DOMAIN': DomainConfig({
+        'nodes': ResourceConfig(Node),
+    }).render()
+}
+
+
+class TestUniqueBatch(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestUniqueBatch, self).setUp(SETTINGS, url_converters, Base)
+
+    def bulk_insert(self):
+        self.app.data.insert('nodes', [{'id': 1, 'name': 'a'}])
+
+    def test_unique_values_are_checked_in_batches(self):
+        statements = []
+
+        def count_statement(*args, **kwargs):
+            statements.append(args[2])
+
+        engine = self.connection.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            response, status = self.post('/nodes', data=[
+                {'name': 'n%d' % k} for k in range(50)])
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+        self.assert201(status)
+        selects = [s for s in statements if s.lstrip().startswith('SELECT')]
+        self.assertLessEqual(len(selects), 2)
+
+    def test_existing_and_duplicate_values(self):
+        response, status = self.post('/nodes', data=[
+            {'name': 'b'}, {'name': 'a'}, {'name': 'b'}])
+        self.assert422(status)
+        self.assertEqual([item['_status'] for item in response['_items']],
+                         ['OK', 'ERR', 'ERR'])
+        self.assertIn('name', response['_items'][1]['_issues'])
+        self.assertIn('name', response['_items'][2]['_issues'])
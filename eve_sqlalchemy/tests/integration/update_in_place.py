@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import Column, DateTime, Integer, String, event, func
+from sqlalchemy.ext.declarative import declarative_base
+from werkzeug.exceptions import HTTPException
+
+from eve_sqlalchemy.config import DomainConfig, ResourceConfig
+from eve_sqlalchemy.tests import TestMinimal
+
+Base = declarative_base()
+
+
+class BaseModel(Base):
+    __abstract__ = True
+    _created = Column(DateTime, default=func.now())
+    _updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    _etag = Column(String(40))
+
+
+class Node(BaseModel):
+    __tablename__ = 'node'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    rank = Column(Integer, default=7)
+
+
+SETTINGS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'RESOURCE_METHODS': ['GET', 'POST', 'DELETE'],
+    'ITEM_METHODS': ['GET', 'PATCH', 'DELETE', 'PUT'],
+    'DOMAIN': DomainConfig({
+        'nodes': ResourceConfig(Node),
+        'recreated_nodes': ResourceConfig(Node),
+        'orm_nodes': ResourceConfig(Node),
+    }).render()
+}
+SETTINGS['DOMAIN']['recreated_nodes']['sql_replace_mode'] = 'recreate'
+SETTINGS['DOMAIN']['orm_nodes']['sql_bulk_update'] = False
+
+
+class TestUpdateInPlace(TestMinimal):
+
+    def setUp(self, url_converters=None):
+        super(TestUpdateInPlace, self).setUp(SETTINGS, url_converters, Base)
+
+    def bulk_insert(self):
+        self.app.data.insert('nodes', [{'id': 1, 'name': 'a', 'rank': 1,
+                                        '_etag': 'x'}])
+
+    def test_patch(self):
+        response, status = self.get('nodes', item=1)
+        _, status = self.patch('/nodes/1', data={'name': 'b'},
+                               headers=[('If-Match', response['_etag'])])
+        self.assert200(status)
+        response, status = self.get('nodes', item=1)
+        self.assertEqual(response['name'], 'b')
+
+    def test_update_detects_concurrent_changes(self):
+        with self.app.test_request_context():
+            original = self.app.data.find_one_raw('nodes', 1)
+            self.app.data.update('nodes', 1, {'_etag': 'y'}, original)
+            with self.assertRaises(HTTPException) as cm:
+                self.app.data.update('nodes', 1, {'name': 'c'}, original)
+            self.assertEqual(cm.exception.code, 412)
+
+    def test_update_missing_document(self):
+        with self.app.test_request_context():
+            with self.assertRaises(HTTPException) as cm:
+                self.app.data.update('nodes', 2, {'name': 'c'}, {'id': 2})
+            self.assertEqual(cm.exception.code, 500)
+
+    def test_put_resets_missing_fields(self):
+        for resource in ('nodes', 'recreated_nodes'):
+            response, status = self.get(resource, item=1)
+            _, status = self.put('/%s/1' % resource, data={'name': 'b'},
+                                 headers=[('If-Match', response['_etag'])])
+            self.assert200(status)
+            response, status = self.get(resource, item=1)
+            self.assertEqual(response['name'], 'b')
+            self.assertEqual(response['rank'], 7)
+            with self.app.test_request_context():
+                self.app.data.update('nodes', 1, {'rank': 1}, response)
+
+    def test_update_without_original(self):
+        with self.app.test_request_context():
+            self.app.data.update('nodes', 1, {'name': 'c'}, None)
+            document = self.app.data.find_one_raw('nodes', 1)
+        self.assertEqual(document['name'], 'c')
+
+    def test_update_with_set_listener(self):
+        names = []
+
+        def listener(target, value, oldvalue, initiator):
+            names.append(value)
+        event.listen(Node.name, 'set', listener)
+        self.addCleanup(event.remove, Node.name, 'set', listener)
+        with self.app.test_request_context():
+            original = self.app.data.find_one_raw('nodes', 1)
+            self.app.data.update('nodes', 1, {'name': 'c'}, original)
+        self.assertEqual(names, ['c'])
+
+    def test_update_without_bulk_update(self):
+        flushes = []
+
+        def listener(session, flush_context, instances):
+            flushes.append(session)
+        event.listen(SignallingSession, 'before_flush', listener)
+        self.addCleanup(event.remove, SignallingSession, 'before_flush',
+                        listener)
+        with self.app.test_request_context():
+            original = self.app.data.find_one_raw('nodes', 1)
+            self.app.data.update('nodes', 1, {'name': 'c'}, original)
+            self.assertEqual(flushes, [])
+            original = self.app.data.find_one_raw('orm_nodes', 1)
+            self.app.data.update('orm_nodes', 1, {'name': 'd'}, original)
+            self.assertEqual(len(flushes), 1)
+            document = self.app.data.find_one_raw('orm_nodes', 1)
+        self.assertEqual(document['name'], 'd')
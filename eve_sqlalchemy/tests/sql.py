@@ -9,15 +9,22 @@ from operator import and_, or_
 from unittest import TestCase
 
 import eve
+from eve.exceptions import ConfigException
 from eve.utils import str_to_date
+from sqlalchemy.ext import baked
 from sqlalchemy.sql.elements import BooleanClauseList
 
 from eve_sqlalchemy import SQL
+from eve_sqlalchemy.cache import LRUCache, SizedLRUCache
 from eve_sqlalchemy.parser import (
-    ParseError, parse, parse_dictionary, parse_sorting, sqla_op,
+    ParseError, expression_key, filter_cache, lookup_key, parameterize, parse,
+    parse_dictionary, parse_sorting, sqla_op,
 )
 from eve_sqlalchemy.structures import SQLAResultCollection
-from eve_sqlalchemy.tests.test_sql_tables import Contacts
+from eve_sqlalchemy.tests.test_sql_tables import Contacts, Invoices
+from eve_sqlalchemy.utils import (
+    column_plan, projected_columns, supports_bulk_delete, supports_bulk_update,
+)
 
 
 class TestSQLParser(TestCase):
@@ -126,6 +133,51 @@ class TestSQLParser(TestCase):
         self.assertTrue(len(r) == 1)
         self.assertTrue(expected_expression.compare(r[0]))
 
+    def test_parse_uses_cached_templates(self):
+        filter_cache.clear()
+        parse('prog > 5 and username == "john"', self.model)
+        r = parse('prog>7 and username=="mark"', self.model)
+        self.assertEqual(filter_cache.info()['hits'], 1)
+        expected_expression = sqla_op.gt(self.model.prog, 7)
+        self.assertTrue(expected_expression.compare(r[0].clauses[0]))
+        expected_expression = sqla_op.eq(self.model.username, 'mark')
+        self.assertTrue(expected_expression.compare(r[0].clauses[1]))
+        r = parse('prog>7 and username=="Sun, 06 Nov 1994 08:49:37 GMT"',
+                  self.model)
+        expected_expression = \
+            sqla_op.eq(self.model.username,
+                       str_to_date('Sun, 06 Nov 1994 08:49:37 GMT'))
+        self.assertTrue(expected_expression.compare(r[0].clauses[1]))
+
+    def test_parse_caches_parse_errors(self):
+        filter_cache.clear()
+        self.assertRaises(ParseError, parse, 'prog + 5', self.model)
+        self.assertRaises(ParseError, parse, 'prog + 6', self.model)
+        self.assertEqual(filter_cache.info()['hits'], 1)
+
+    def test_expression_key(self):
+        self.assertEqual(expression_key('prog > 5 and username == "john"'),
+                         expression_key('prog>7 and username=="mark"'))
+        self.assertNotEqual(expression_key('prog > 5'),
+                            expression_key('prog < 5'))
+        self.assertNotEqual(expression_key('prog > 5'),
+                            expression_key('prog > "5"'))
+
+    def test_lookup_key(self):
+        self.assertEqual(lookup_key(self.model, {'username': 'john'}),
+                         lookup_key(self.model, {'username': 'mark'}))
+        self.assertIsNone(lookup_key(self.model, {'prog': '!= 5'}))
+        self.assertIsNone(lookup_key(self.model, {'username': 'like("j%")'}))
+        self.assertIsNone(lookup_key(self.model, {'prog': [1, 2]}))
+        self.assertIsNone(lookup_key(self.model, {'prog': None}))
+
+    def test_parameterize(self):
+        conditions, params = parameterize(
+            parse('prog > 5 and username == "john"', self.model))
+        self.assertEqual(params, {'_p0': 5, '_p1': 'john'})
+        self.assertEqual(str(conditions[0]),
+                         'contacts.prog > :_p0 AND contacts.username = :_p1')
+
     def test_parse_dictionary(self):
         r = parse_dictionary({'username': 'john', 'prog': '!= 5'}, self.model)
         self.assertEqual(type(r), list)
@@ -217,6 +269,127 @@ class TestSQLStructures(TestCase):
             self.assertEqual(len(results), self.max_results)
         self.dropDB()
 
+    def test_sql_collection_count_strategies(self):
+        self.setupDB()
+        for strategy in ('exact', 'lazy', 'estimated'):
+            c = SQLAResultCollection(self.query, self.fields,
+                                     count_strategy=strategy)
+            self.assertEqual(c.count(), self.known_resource_count)
+        c = SQLAResultCollection(self.query, self.fields,
+                                 count_strategy='none')
+        self.assertIsNone(c.count())
+        self.assertRaises(ConfigException, SQLAResultCollection, self.query,
+                          self.fields, count_strategy='unknown')
+        self.dropDB()
+
+    def test_sql_collection_cached_count(self):
+        self.setupDB()
+        cache = LRUCache()
+        c = SQLAResultCollection(self.query, self.fields,
+                                 spec=[Contacts.prog < 10],
+                                 count_strategy='cached', count_cache=cache)
+        self.assertEqual(c.count(), 10)
+        self.query.filter(Contacts.prog == 0).delete()
+        c = SQLAResultCollection(self.query, self.fields,
+                                 spec=[Contacts.prog < 10],
+                                 count_strategy='cached', count_cache=cache)
+        self.assertEqual(c.count(), 10)
+        c = SQLAResultCollection(self.query, self.fields,
+                                 spec=[Contacts.prog < 20],
+                                 count_strategy='cached', count_cache=cache)
+        self.assertEqual(c.count(), 19)
+        self.assertEqual(cache.info()['hits'], 1)
+        self.dropDB()
+
+    def test_sized_lru_cache(self):
+        cache = SizedLRUCache(maxbytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', b'1234')
+        cache.get('a')
+        cache.set('c', b'123')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'12345')
+        self.assertEqual(cache.info()['bytes'], 8)
+        self.assertEqual(cache.info()['hit_ratio'], 2 / 3.0)
+        cache.set('a', b'1')
+        self.assertEqual(cache.bytes, 4)
+        cache.clear()
+        self.assertEqual(cache.bytes, 0)
+
+    def test_sql_collection_baked(self):
+        self.setupDB()
+        bakery = baked.bakery()
+
+        def collection(spec, cache_key):
+            return SQLAResultCollection(
+                self.query, self.fields, spec=spec,
+                sort=[parse_sorting(Contacts, 'prog', -1)], max_results=5,
+                page=2, bakery=bakery, cache_key=cache_key)
+
+        size = None
+        for prog in (10, 20):
+            c = collection([Contacts.prog < prog], ('contacts', '<'))
+            self.assertEqual(c.count(), prog)
+            self.assertEqual([p['prog'] for p in c],
+                             list(range(prog - 6, prog - 11, -1)))
+            # Queries of the same shape reuse the cached entries.
+            if size is None:
+                size = len(bakery.cache)
+            self.assertEqual(len(bakery.cache), size)
+        c = collection([Contacts.prog > 10], ('contacts', '>'))
+        self.assertEqual(c.count(), 90)
+        self.assertEqual([p['prog'] for p in c], list(range(95, 90, -1)))
+        self.assertGreater(len(bakery.cache), size)
+        self.dropDB()
+
+    def test_projected_columns(self):
+        self.setupDB()
+        with self.app.app_context():
+            self.assertEqual(
+                projected_columns(Contacts, ['username', 'unknown']),
+                ['_created', '_etag', '_updated', 'username'])
+            self.assertEqual(
+                projected_columns(Invoices, ['person', 'invoicing_contacts',
+                                             'inv_number']),
+                ['_created', '_etag', '_id', '_updated', 'inv_number',
+                 'person_id'])
+        self.dropDB()
+
+    def test_sql_collection_rows(self):
+        self.setupDB()
+        with self.app.app_context():
+            columns = column_plan(Contacts, ['_id', 'username'])
+            self.assertEqual(columns, ('_id', 'username', '_updated',
+                                       '_created', '_etag'))
+            self.assertIsNone(column_plan(Invoices, ['person']))
+            query = self.connection.session.query(
+                *[getattr(Contacts, key) for key in columns])
+            c = SQLAResultCollection(query, ['_id', 'username'],
+                                     spec=[Contacts.prog == 5],
+                                     columns=columns)
+            self.assertEqual(c.count(), 1)
+            result = list(c)[0]
+            self.assertEqual(sorted(result.keys()), sorted(columns))
+            self.assertEqual(result['username'], self.query.filter(
+                Contacts.prog == 5).one().username)
+        self.dropDB()
+
+    def test_supports_bulk_delete(self):
+        self.assertTrue(supports_bulk_delete(Contacts, [Contacts.prog > 5]))
+        self.assertFalse(supports_bulk_delete(Invoices, []))
+        self.assertFalse(supports_bulk_delete(
+            Contacts, [Contacts._id == Invoices.person_id]))
+
+    def test_supports_bulk_update(self):
+        condition = [Invoices._id == 1]
+        self.assertTrue(supports_bulk_update(Invoices, condition,
+                                             {'inv_number': '42'}))
+        self.assertTrue(supports_bulk_update(Invoices, condition,
+                                             {'person_id': 1}))
+        self.assertFalse(supports_bulk_update(Invoices, condition,
+                                              {'person': self.person}))
+        self.assertFalse(supports_bulk_update(Invoices, condition, {}))
+
     def test_base_sorting(self):
         self.setupDB()
         cases = [
@@ -5,7 +5,10 @@ import unittest
 
 import mock
 
-from eve_sqlalchemy.utils import extract_sort_arg
+from eve_sqlalchemy.utils import (
+    _get_resource, extract_sort_arg, rename_relationship_fields_in_dict,
+    rename_relationship_fields_in_str,
+)
 
 
 class TestUtils(unittest.TestCase):
@@ -25,3 +28,42 @@ class TestUtils(unittest.TestCase):
         req = mock.Mock()
         req.sort = ''
         self.assertEqual(extract_sort_arg(req), None)
+
+    def test_get_resource_uses_index(self):
+        class Node(object):
+            pass
+
+        domain = {
+            'nodes': {'datasource': {'source': 'Node'}, 'id_field': 'id'},
+            'other_nodes': {'datasource': {'source': 'Node'},
+                            'id_field': 'id'},
+        }
+        with mock.patch('eve_sqlalchemy.utils.config') as config:
+            config.DOMAIN = domain
+            self.assertEqual(_get_resource(Node), 'nodes')
+            domain['leaves'] = {'datasource': {'source': 'Leaf'},
+                                'id_field': 'id'}
+            Node.__name__ = 'Leaf'
+            self.assertEqual(_get_resource(Node), 'leaves')
+            config.DOMAIN = {}
+            self.assertIsNone(_get_resource(Node))
+
+    def test_rename_relationship_fields(self):
+        class Parent(object):
+            pass
+
+        domain = {'parents': {
+            'datasource': {'source': 'Parent'}, 'id_field': 'id',
+            'schema': {'child': {'local_id_field': 'child_id'},
+                       'children': {'local_id_field': 'children_ids'},
+                       'name': {}}}}
+        with mock.patch('eve_sqlalchemy.utils.config') as config:
+            config.DOMAIN = domain
+            self.assertEqual(
+                rename_relationship_fields_in_str(
+                    Parent, 'child == 1 and children == 2 and child.id == 3'),
+                'child_id == 1 and children_ids == 2 and child.id == 3')
+            self.assertEqual(
+                rename_relationship_fields_in_dict(Parent,
+                                                   {'child': 1, 'name': 2}),
+                {'child_id': 1, 'name': 2})
@@ -9,11 +9,22 @@
 from __future__ import unicode_literals
 
 import ast
+import base64
+import binascii
 import copy
+import datetime
+import decimal
+import json
 import re
 
 from eve.utils import config
+from sqlalchemy import inspect
 from sqlalchemy.ext.declarative.api import DeclarativeMeta
+from sqlalchemy.orm import (
+    ColumnProperty, RelationshipProperty, joinedload, selectinload,
+)
+from sqlalchemy.orm.interfaces import MANYTOONE
+from sqlalchemy.sql.util import find_tables
 
 try:
     from collections.abc import Mapping, MutableSequence, Set
@@ -93,6 +104,174 @@ def sqla_object_to_dict(obj, fields):
     return result
 
 
+def projected_columns(model, fields):
+    """Returns the names of the column attributes of `model` which have to be
+    loaded to render `fields` using :func:`sqla_object_to_dict`, to be used
+    with :func:`sqlalchemy.orm.load_only`.
+
+    Relationships require their local foreign key columns. Returns `None` if
+    all columns are required, e.g. for hybrid properties or association
+    proxies, which may depend on any column.
+    """
+    mapper = inspect(model)
+    fields = set(f.split('.', 1)[0] for f in fields)
+    fields.update([config.LAST_UPDATED, config.DATE_CREATED, config.ETAG])
+    result = set()
+    for field in fields:
+        prop = mapper.attrs.get(field)
+        if prop is None:
+            if field in mapper.all_orm_descriptors:
+                return None
+        elif isinstance(prop, ColumnProperty):
+            result.add(field)
+        elif isinstance(prop, RelationshipProperty):
+            result.update(mapper.get_property_by_column(c).key
+                          for c in prop.local_columns)
+        else:
+            return None
+    return sorted(result)
+
+
+def relationship_load_options(model, paths):
+    """Returns the query options eagerly loading the relationships of `model`
+    given as (probably dotted) `paths`, so they are loaded in a batch with the
+    query instead of lazily for each row. Paths which are not relationships
+    are ignored.
+
+    Collections are loaded using `selectinload`, scalar relationships using
+    `joinedload`.
+    """
+    options = []
+    for path in sorted(set(paths)):
+        option = None
+        cls = model
+        for name in path.split('.'):
+            attr = getattr(cls, name, None)
+            prop = getattr(attr, 'property', None)
+            if not isinstance(prop, RelationshipProperty):
+                break
+            loader = selectinload if prop.uselist else joinedload
+            option = loader(attr) if option is None \
+                else getattr(option, loader.__name__)(attr)
+            cls = prop.mapper.class_
+        if option is not None:
+            options.append(option)
+    return options
+
+
+def column_plan(model, fields):
+    """Returns the keys of the column attributes of `model` to select in
+    order to render `fields` from plain rows instead of model instances, with
+    the same result as :func:`sqla_object_to_dict`.
+
+    Returns `None` if any of the fields is not a plain column or if `model`
+    uses inheritance.
+    """
+    mapper = inspect(model)
+    if mapper.inherits is not None or mapper.polymorphic_on is not None:
+        return None
+    fields = [f.split('.', 1)[0] for f in fields]
+    fields += [config.LAST_UPDATED, config.DATE_CREATED]
+    if getattr(config, 'IF_MATCH', True):
+        fields.append(config.ETAG)
+    result = []
+    for field in fields:
+        prop = mapper.attrs.get(field)
+        if prop is None:
+            if field in mapper.all_orm_descriptors:
+                return None
+        elif not isinstance(prop, ColumnProperty):
+            return None
+        elif field not in result:
+            result.append(field)
+    return tuple(result)
+
+
+def row_to_dict(row, keys):
+    """Creates a dict out of a row selected according to a
+    :func:`column_plan`. Additional columns at the end of the row are
+    ignored."""
+    result = dict(zip(keys, row))
+    # We have to remove the ETAG if it's None so Eve will add it later again.
+    if result.get(config.ETAG, False) is None:
+        del(result[config.ETAG])
+    return result
+
+
+def column_default(column):
+    """Returns the value a column is set to if it is omitted on insert, i.e.
+    its scalar default, its SQL expression default or `None`.
+
+    :raises ValueError: if the default is computed by a Python function or by
+                        the database.
+    """
+    if column.server_default is not None:
+        raise ValueError('Server defaults are not supported')
+    default = column.default
+    if default is None:
+        return None
+    if default.is_scalar or default.is_clause_element:
+        return default.arg
+    raise ValueError('Python function defaults are not supported')
+
+
+def supports_bulk_delete(model, conditions):
+    """Returns whether the rows of `model` matching `conditions` can be
+    deleted with a single `DELETE ... WHERE` statement, bypassing the ORM.
+
+    This is not the case if the conditions refer to other tables, if `model`
+    uses inheritance or has delete listeners, or if any of its relationships
+    needs per-row handling by the ORM (delete cascades, nulling out foreign
+    keys of related rows and cleaning up association tables). Relationships
+    configured with `passive_deletes` are left to the database.
+    """
+    mapper = inspect(model)
+    if mapper.inherits is not None or mapper.polymorphic_on is not None:
+        return False
+    if mapper.dispatch.before_delete or mapper.dispatch.after_delete:
+        return False
+    for prop in mapper.relationships:
+        if prop.viewonly or prop.passive_deletes:
+            continue
+        if prop.direction is not MANYTOONE or prop.cascade.delete:
+            return False
+    return _only_refers_to(mapper.local_table, conditions)
+
+
+def supports_bulk_update(model, conditions, values):
+    """Returns whether the rows of `model` matching `conditions` can be
+    updated with `values` using a single `UPDATE ... WHERE` statement,
+    bypassing the ORM.
+
+    This is only the case if all values are meant for plain columns of
+    `model` without validators or `set` listeners, there are no update
+    listeners, no version counter, no inheritance and the conditions don't
+    refer to other tables. Listeners of the session can't be detected.
+    """
+    mapper = inspect(model)
+    if not values or mapper.inherits is not None or \
+       mapper.polymorphic_on is not None or mapper.version_id_col is not None:
+        return False
+    if mapper.dispatch.before_update or mapper.dispatch.after_update:
+        return False
+    for key, value in values.items():
+        prop = mapper.attrs.get(key)
+        if not isinstance(prop, ColumnProperty) or key in mapper.validators \
+           or isinstance(value.__class__, DeclarativeMeta):
+            return False
+        if prop.class_attribute.dispatch.set:
+            return False
+    return _only_refers_to(mapper.local_table, conditions)
+
+
+def _only_refers_to(table, conditions):
+    for condition in conditions:
+        tables = find_tables(condition, check_columns=True)
+        if any(t is not table for t in tables):
+            return False
+    return True
+
+
 def _sanitize_value(value):
     if isinstance(value.__class__, DeclarativeMeta):
         return _get_id(value)
@@ -107,8 +286,8 @@ def _sanitize_value(value):
 
 
 def _get_id(obj):
-    resource = _get_resource(obj)
-    return getattr(obj, config.DOMAIN[resource]['id_field'])
+    _, id_field = _get_model_index()[obj.__class__.__name__]
+    return getattr(obj, id_field)
 
 
 def extract_sort_arg(req):
@@ -127,6 +306,66 @@ def extract_sort_arg(req):
         return None
 
 
+def encode_cursor(keys, values):
+    """Encodes the sort keys and the corresponding values of a row into an
+    opaque token used for keyset pagination."""
+    payload = json.dumps({'k': keys, 'v': [_encode_cursor_value(v)
+                                           for v in values]},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')) \
+        .decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decodes a token created by :func:`encode_cursor`. Returns a tuple of
+    the sort keys and the row values.
+
+    :raises ValueError: if the token is malformed.
+    """
+    try:
+        token = str(token)
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(payload.decode('utf-8'))
+        keys, values = payload['k'], payload['v']
+        if not isinstance(keys, list) or not isinstance(values, list) or \
+           len(keys) != len(values):
+            raise ValueError('Invalid cursor')
+        return keys, [_decode_cursor_value(v) for v in values]
+    except (TypeError, KeyError, UnicodeError, binascii.Error,
+            decimal.InvalidOperation):
+        raise ValueError('Invalid cursor')
+
+
+_cursor_types = {
+    'datetime': (datetime.datetime,
+                 lambda v: v.strftime('%Y-%m-%dT%H:%M:%S.%f'),
+                 lambda v: datetime.datetime.strptime(
+                     v, '%Y-%m-%dT%H:%M:%S.%f')),
+    'date': (datetime.date,
+             lambda v: v.strftime('%Y-%m-%d'),
+             lambda v: datetime.datetime.strptime(v, '%Y-%m-%d').date()),
+    'decimal': (decimal.Decimal, str, decimal.Decimal),
+}
+
+
+def _encode_cursor_value(value):
+    # datetime is a subclass of date, so it has to be checked first.
+    for name in ('datetime', 'date', 'decimal'):
+        type_, encode, _ = _cursor_types[name]
+        if isinstance(value, type_):
+            return {name: encode(value)}
+    return value
+
+
+def _decode_cursor_value(value):
+    if isinstance(value, dict):
+        if len(value) != 1 or list(value)[0] not in _cursor_types:
+            raise ValueError('Invalid cursor')
+        name, encoded = list(value.items())[0]
+        return _cursor_types[name][2](encoded)
+    return value
+
+
 def rename_relationship_fields_in_sort_args(model, sort):
     result = []
     for t in sort:
@@ -139,7 +378,7 @@ def rename_relationship_fields_in_sort_args(model, sort):
 
 def rename_relationship_fields_in_dict(model, dict_):
     result = {}
-    rename_mapping = _get_relationship_to_id_field_rename_mapping(model)
+    rename_mapping, _ = _get_rename_plan(model)
     for k, v in dict_.items():
         if k in rename_mapping:
             result[rename_mapping[k]] = v
@@ -149,20 +388,34 @@ def rename_relationship_fields_in_dict(model, dict_):
 
 
 def rename_relationship_fields_in_str(model, str_):
-    rename_mapping = _get_relationship_to_id_field_rename_mapping(model)
-    for k, v in rename_mapping.items():
-        str_ = re.sub(r'\b%s\b(?!\.)' % k, v, str_)
-    return str_
+    rename_mapping, regex = _get_rename_plan(model)
+    if regex is None:
+        return str_
+    return regex.sub(lambda m: rename_mapping[m.group(0)], str_)
 
 
-def _get_relationship_to_id_field_rename_mapping(model):
-    result = {}
-    resource = _get_resource(model)
-    schema = config.DOMAIN[resource]['schema']
-    for field, field_schema in schema.items():
-        if 'local_id_field' in field_schema:
-            result[field] = field_schema['local_id_field']
-    return result
+def _get_rename_plan(model):
+    """Returns the mapping of the relationship fields of the resource of
+    `model` to their `local_id_field` and a compiled regex matching all of
+    them in a string (`None` if there are none).
+
+    Plans are computed once per model and domain, see `_get_model_index`.
+    """
+    index, plans = _get_model_indexes()
+    plan = plans.get(model)
+    if plan is None:
+        mapping = {}
+        resource = index.get(model.__name__, (None, None))[0]
+        schema = config.DOMAIN[resource]['schema']
+        for field, field_schema in schema.items():
+            if 'local_id_field' in field_schema:
+                mapping[field] = field_schema['local_id_field']
+        regex = None
+        if mapping:
+            regex = re.compile(r'\b(?:%s)\b(?!\.)' % '|'.join(
+                re.escape(k) for k in sorted(mapping, key=len, reverse=True)))
+        plan = plans[model] = (mapping, regex)
+    return plan
 
 
 def _get_resource(model_or_obj):
@@ -170,6 +423,39 @@ def _get_resource(model_or_obj):
         model = model_or_obj.__class__
     else:
         model = model_or_obj
-    for resource, settings in config.DOMAIN.items():
-        if settings['datasource']['source'] == model.__name__:
-            return resource
+    return _get_model_index().get(model.__name__, (None, None))[0]
+
+
+# The last domain indexed, its size, its index and the rename plans of its
+# models, see `_get_model_indexes`.
+_model_index = (None, None, {}, {})
+
+
+def _get_model_index():
+    """Returns a dictionary mapping the names of the models to the first
+    resource using them as their source and its `id_field`.
+
+    The index is rebuilt if the domain is replaced or if resources are added
+    or removed.
+    """
+    return _get_model_indexes()[0]
+
+
+def _get_model_indexes():
+    global _model_index
+    domain = config.DOMAIN
+    indexed_domain, size, index, plans = _model_index
+    if indexed_domain is not domain or size != len(domain):
+        index = {}
+        plans = {}
+        complete = True
+        for resource, settings in domain.items():
+            if 'datasource' not in settings:
+                # The resource is not registered yet.
+                complete = False
+                continue
+            index.setdefault(settings['datasource']['source'],
+                             (resource, settings.get('id_field')))
+        if complete:
+            _model_index = (domain, len(domain), index, plans)
+    return index, plans
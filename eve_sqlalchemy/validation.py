@@ -19,7 +19,8 @@ from eve.utils import config, str_type
 from eve.versioning import (
     get_data_version_relation_document, missing_version_field,
 )
-from flask import current_app as app
+from flask import current_app as app, g, has_request_context, request
+from werkzeug.datastructures import FileStorage
 
 from eve_sqlalchemy.utils import dict_update, remove_none_values
 
@@ -34,6 +35,11 @@ class ValidatorSQL(Validator):
         self.resource = resource
         self._id = None
         self._original_document = None
+        # Eve validates all documents of a bulk POST using the same
+        # validator, which allows checking unique values in batches.
+        self._unique_values = {}
+        self._seen_unique_values = collections.defaultdict(set)
+        self._related_candidates = {}
         kwargs['transparent_schema_rules'] = True
         super(ValidatorSQL, self).__init__(schema, **kwargs)
         if resource:
@@ -57,10 +63,139 @@ class ValidatorSQL(Validator):
             elif field != id_field and self._id is not None:
                 query = {field: value, id_field: '!= \'%s\'' % self._id}
             else:
+                if self._is_duplicate_in_batch(field, value):
+                    self._error(field, "value '%s' is not unique" % value)
+                    return
+                existing = self._existing_unique_value(field, value)
+                if existing is not None:
+                    if existing:
+                        self._error(field,
+                                    "value '%s' is not unique" % value)
+                    return
                 query = {field: value}
             if app.data.find_one(self.resource, None, **query):
                 self._error(field, "value '%s' is not unique" % value)
 
+    def _is_duplicate_in_batch(self, field, value):
+        """Returns whether `value` has already been validated for `field` in
+        another document of the same request.
+        """
+        try:
+            if value in self._seen_unique_values[field]:
+                return True
+            self._seen_unique_values[field].add(value)
+        except TypeError:  # unhashable
+            pass
+        return False
+
+    def _existing_unique_value(self, field, value):
+        """Returns whether `value` is already used for `field`, or `None` if
+        this is unknown.
+
+        On first use for a field, the values of the field in all documents
+        of the request's payload are checked at once using
+        :meth:`~eve_sqlalchemy.SQL.find_existing_values`.
+        """
+        if field not in self._unique_values:
+            candidates = self._payload_values(field)
+            existing = app.data.find_existing_values(
+                self.resource, field, candidates) if candidates else None
+            self._unique_values[field] = (candidates, existing)
+        candidates, existing = self._unique_values[field]
+        try:
+            if existing is None or value not in candidates:
+                return None
+        except TypeError:  # unhashable
+            return None
+        if value in existing:
+            return True
+        if _matches_loosely(value, existing):
+            return None
+        return False
+
+    def _payload_values(self, field):
+        """Returns the set of hashable values of `field` in the documents of
+        the current request's payload.
+        """
+        values = set()
+        for document in _payload_documents():
+            try:
+                values.add(document[field])
+            except (KeyError, TypeError):
+                pass
+        return values
+
+    def _related_value_exists(self, resource, field, value):
+        """Returns whether a document of `resource` with `value` as `field`
+        exists, without loading it.
+
+        Existing values are cached for the current request. On first use for
+        a related resource and field, all values referencing it in the
+        documents of the request's payload are checked at once.
+        """
+        try:
+            hash(value)
+        except TypeError:
+            return bool(app.data.find_one(resource, None, **{field: value}))
+        key = (resource, field)
+        if not hasattr(g, 'sql_existing_related_values'):
+            g.sql_existing_related_values = collections.defaultdict(set)
+        existing = g.sql_existing_related_values[key]
+        if value in existing:
+            return True
+
+        if key not in self._related_candidates:
+            candidates = self._payload_relation_values(resource, field)
+            found = app.data.find_existing_values(
+                resource, field, candidates) if candidates else None
+            if found is None:
+                candidates = set()
+            existing.update(found or ())
+            self._related_candidates[key] = candidates
+        if value in existing:
+            return True
+        if value in self._related_candidates[key] and \
+           not _matches_loosely(value, existing):
+            return False
+
+        found = app.data.find_existing_values(resource, field, [value])
+        if found is None:
+            found = app.data.find_one(resource, None, **{field: value})
+        if found:
+            existing.add(value)
+        return bool(found)
+
+    def _payload_relation_values(self, resource, field):
+        """Returns the set of hashable values of all fields of the current
+        request's payload referencing `field` of `resource`.
+        """
+        def references(field_schema):
+            data_relation = field_schema.get('data_relation', {})
+            return data_relation.get('resource') == resource and \
+                data_relation.get('field') == field and \
+                not data_relation.get('version')
+
+        fields = []
+        for name, field_schema in self.schema.items():
+            if references(field_schema):
+                fields.append((name, False))
+            elif field_schema.get('type') in ('list', 'set') and \
+                    references(field_schema.get('schema', {})):
+                fields.append((name, True))
+
+        values = set()
+        for document in _payload_documents():
+            for name, is_list in fields:
+                value = document.get(name)
+                for v in (value if is_list and isinstance(value, list)
+                          else [value]):
+                    try:
+                        if v is not None:
+                            values.add(v)
+                    except TypeError:  # unhashable
+                        pass
+        return values
+
     def _validate_data_relation(self, data_relation, field, value):
         if 'version' in data_relation and data_relation['version'] is True:
             value_field = data_relation['field']
@@ -97,8 +232,8 @@ class ValidatorSQL(Validator):
                                     "with fields '%s' and '%s'") %
                             (value_field, version_field))
         else:
-            query = {data_relation['field']: value}
-            if not app.data.find_one(data_relation['resource'], None, **query):
+            if not self._related_value_exists(data_relation['resource'],
+                                              data_relation['field'], value):
                 self._error(field, ("value '%s' must exist in resource '%s', "
                                     "field '%s'") %
                             (value, data_relation['resource'],
@@ -118,6 +253,16 @@ class ValidatorSQL(Validator):
         """
         pass
 
+    def _validate_type_media(self, field, value):
+        """ Enables validation for `media` data type.
+
+        :param field: field name.
+        :param value: field value.
+        """
+        # Copied from eve/io/mongo/validation.py.
+        if not isinstance(value, FileStorage):
+            self._error(field, "file was expected, got '%s' instead." % value)
+
     def _validate_readonly(self, read_only, field, value):
         # Copied from eve/io/mongo/validation.py.
         original_value = self._original_document.get(field) \
@@ -172,3 +317,25 @@ class ValidatorSQL(Validator):
             err = self._errors[field]
             if not isinstance(err, list):
                 self._errors[field] = [err]
+
+
+def _payload_documents():
+    """Returns the documents of the current request's payload."""
+    if not has_request_context():
+        return []
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list):
+        return []
+    return [document for document in payload if isinstance(document, dict)]
+
+
+def _matches_loosely(value, values):
+    """Returns whether a string is equal to any of `values` if case and
+    trailing whitespace are ignored, as the database might use a collation
+    doing so.
+    """
+    return isinstance(value, str_type) and \
+        any(isinstance(v, str_type) and
+            v.rstrip().lower() == value.rstrip().lower() for v in values)